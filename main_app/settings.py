@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/2.0/ref/settings/
 """
 
 import os
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -56,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'profiles.middleware.MetricsMiddleware',
+    'profiles.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -96,12 +98,55 @@ DATABASES = {
         'USER': config('DB_USER'),
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST'),
+        # seconds connections are kept open, 0 closes them after each request
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
         'TEST': {
             'NAME': config('DB_TEST_NAME'),
         }
     }
 }
 
+# optional read-only replica of the default database, serving the reads of
+# the public pages (see profiles.routers)
+if config('DB_REPLICA_NAME', default=''):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=config('DB_REPLICA_NAME'),
+        USER=config('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        PASSWORD=config('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        HOST=config('DB_REPLICA_HOST', default=DATABASES['default']['HOST']),
+        CONN_MAX_AGE=config('DB_REPLICA_CONN_MAX_AGE',
+                            default=DATABASES['default']['CONN_MAX_AGE'], cast=int),
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['profiles.routers.ReplicaRouter']
+
+# seconds the replica may lag behind: public pages read from the default
+# database for this long after the directory changes, and after each write
+# request of a user
+DB_REPLICA_LAG = config('DB_REPLICA_LAG', default=5, cast=int)
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND',
+                          default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='wiml-directory'),
+    }
+}
+
+# public pages are invalidated when the profiles they show change, this
+# only bounds how long unused entries are kept
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+
+# fraction of the requests measured by profiles.middleware.MetricsMiddleware,
+# and how often each process publishes its metrics to the cache in seconds
+METRICS_SAMPLE_RATE = config('METRICS_SAMPLE_RATE', default=0.1, cast=float)
+METRICS_PUBLISH_INTERVAL = config('METRICS_PUBLISH_INTERVAL', default=10, cast=int)
+
 LOGIN_URL = '/login'
 LOGIN_REDIRECT_URL = 'profiles:user'
 LOGOUT_REDIRECT_URL = 'profiles:home'
@@ -130,6 +175,19 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Passwords are stored with the first hasher and checked with any of them,
+# a password stored with another one is hashed again on login. Development
+# and test environments can list a fast hasher first, such as MD5 for the
+# fixtures, which production must not accept.
+# https://docs.djangoproject.com/en/2.2/topics/auth/passwords/
+
+PASSWORD_HASHERS = config('PASSWORD_HASHERS', cast=Csv(), default=','.join([
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]))
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.0/topics/i18n/
 
@@ -153,6 +211,11 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = os.path.join(BASE_DIR, "static-collected")
 
+# snapshots of the directory searched in browsers (see profiles.snapshot),
+# which the web server can serve from /list/snapshot/ with their gzip and
+# brotli encodings
+SNAPSHOT_ROOT = config('SNAPSHOT_ROOT', default=os.path.join(BASE_DIR, 'snapshots'))
+
 # reCaptcha settings
 RECAPTCHA_PUBLIC_KEY = config('RECAPTCHA_PUBLIC_KEY')
 RECAPTCHA_PRIVATE_KEY = config('RECAPTCHA_PRIVATE_KEY')
@@ -161,6 +224,9 @@ RECAPTCHA_USE_SSL = False
 RECAPTCHA_DOMAIN = 'www.recaptcha.net'
 
 # email server settings
+# emails are queued by the requests and sent by the send_outbox command
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=os.path.join(BASE_DIR, 'sent-emails'))
 EMAIL_HOST = config('EMAIL_HOST')
 EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
@@ -169,11 +235,14 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS') == 'True'
 EMAIL_USE_SSL = config('EMAIL_USE_SSL') == 'True'
 
 EMAIL_FROM = config('DEFAULT_FROM_EMAIL')
+# maximum number of emails sent per second by the outbox, 0 for no limit
+EMAIL_RATE_LIMIT = config('EMAIL_RATE_LIMIT', default=0, cast=float)
 EMAIL_SUBJECT_PREFIX = 'WiML Directory - '
 
 # Sites settings
 SITE_ID = config('SITE_ID', cast=int)
 ROBOTS_CACHE_TIMEOUT = 60 * 60 * 24
+ROBOTS_SITEMAP_VIEW_NAME = 'profiles:sitemap'
 
 # Apps settings
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
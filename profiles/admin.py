@@ -3,7 +3,7 @@ from django.contrib.auth.admin import UserAdmin
 
 # Register your models here.
 from .forms import UserCreateForm, UserForm
-from .models import Profile, Country, User
+from .models import OutboxEmail, Profile, Country, User
 
 
 class CountryAdmin(admin.ModelAdmin):
@@ -13,6 +13,11 @@ class ProfileAdmin(admin.ModelAdmin):
     list_display = ('first_name','last_name', 'position', 'institution')
     search_fields = ('first_name','last_name', 'institution', 'email')
 
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'campaign')
+    search_fields = ('to', 'subject')
+
 
 class CustomUserAdmin(UserAdmin):
     add_form = UserCreateForm
@@ -36,4 +41,5 @@ class CustomUserAdmin(UserAdmin):
 
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Profile, ProfileAdmin)
-admin.site.register(Country, CountryAdmin)
\ No newline at end of file
+admin.site.register(Country, CountryAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
@@ -0,0 +1,236 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, urlencode
+from django.views.decorators.http import condition
+
+DIRECTORY_VERSION_KEY = 'version:directory'
+COUNTRIES_VERSION_KEY = 'version:countries'
+PROFILE_VERSION_KEY = 'version:profile:{}'
+SITEMAP_VERSION_KEY = 'version:sitemap:{}'
+INDEXES_VERSION_KEY = 'version:indexes'
+
+STATS_KEY = 'page-cache:{}:{}'
+STATS_OUTCOMES = ('hits', 'misses', 'not_modified')
+
+# names of the views wrapped by cache_public_page, the same in every process
+_cached_views = set()
+
+
+def _new_version():
+    # a timestamp rather than a counter, so that a version evicted from the
+    # cache can never come back with a value already used in page keys
+    return format(time.time_ns(), 'x')
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def directory_version():
+    """
+    Version of everything derived from the list of public profiles.
+    """
+    return _get_version(DIRECTORY_VERSION_KEY)
+
+
+def countries_version():
+    return _get_version(COUNTRIES_VERSION_KEY)
+
+
+def profile_version(pk):
+    return _get_version(PROFILE_VERSION_KEY.format(pk))
+
+
+def detail_version(pk):
+    """
+    Version of the detail page of a profile, which also shows its country.
+    """
+    return f'{profile_version(pk)}.{countries_version()}'
+
+
+def sitemap_version(section):
+    """
+    Version of a section of the sitemap (see profiles.sitemaps).
+    """
+    return _get_version(SITEMAP_VERSION_KEY.format(section))
+
+
+def indexes_version():
+    """
+    Version of the in-memory indexes of the profiles (see profiles.indexes),
+    bumped when they can not be updated from the saved profiles only.
+    """
+    return _get_version(INDEXES_VERSION_KEY)
+
+
+def bump_directory_version():
+    cache.set(DIRECTORY_VERSION_KEY, _new_version(), None)
+
+
+def bump_countries_version():
+    cache.set(COUNTRIES_VERSION_KEY, _new_version(), None)
+
+
+def bump_profile_version(pk):
+    cache.set(PROFILE_VERSION_KEY.format(pk), _new_version(), None)
+
+
+def bump_sitemap_version(section):
+    cache.set(SITEMAP_VERSION_KEY.format(section), _new_version(), None)
+
+
+def bump_indexes_version():
+    cache.set(INDEXES_VERSION_KEY, _new_version(), None)
+
+
+def version_datetime(version):
+    """
+    Return when a version, or the latest of versions joined by dots, was
+    created: the data it covers has not changed since.
+    """
+    created = max(int(part, 16) for part in version.split('.'))
+    return datetime.fromtimestamp(created // 10 ** 9, timezone.utc)
+
+
+def versioned_condition(version, url_kwargs=()):
+    """
+    Answer conditional GET requests of a view with a 304, from an ETag and
+    a Last-Modified date derived from ``version(**url_kwargs)``, without
+    running the view.
+    """
+    def page_version(kwargs):
+        return version(**{name: kwargs[name] for name in url_kwargs if name in kwargs})
+
+    def etag(request, *args, **kwargs):
+        # API responses are negotiated, each format has its own ETag
+        accept = request.GET.get('format') or kwargs.get('format') \
+            or request.META.get('HTTP_ACCEPT', '')
+        return '{}-{}'.format(page_version(kwargs),
+                              hashlib.md5(accept.encode()).hexdigest()[:8])
+
+    def last_modified(request, *args, **kwargs):
+        return version_datetime(page_version(kwargs))
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def normalized_params(request, params):
+    """
+    Return the query parameters relevant to a page, in a canonical form so
+    that equivalent queries share the same cache entry.
+    """
+    normalized = []
+    for name in params:
+        # pages echo the search string back, only its spacing can be ignored
+        values = [' '.join(value.split()) for value in request.GET.getlist(name)]
+        normalized += [(name, value) for value in values if value]
+    return normalized
+
+
+def _count(view_name, outcome):
+    # atomic in the shared caches, unlike reading and writing back a value
+    key = STATS_KEY.format(view_name, outcome)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # evicted meanwhile
+            cache.add(key, 1, None)
+
+
+def page_cache_stats():
+    """
+    Return the number of cache hits and misses of each cached page.
+    """
+    keys = {(view_name, outcome): STATS_KEY.format(view_name, outcome)
+            for view_name in _cached_views for outcome in STATS_OUTCOMES}
+    counts = cache.get_many(keys.values())
+    stats = {}
+    for view_name in sorted(_cached_views):
+        view_stats = {outcome: counts.get(keys[view_name, outcome], 0)
+                      for outcome in STATS_OUTCOMES}
+        if any(view_stats.values()):
+            stats[view_name] = view_stats
+    return stats
+
+
+def _is_cacheable(request):
+    # logged in users and pending messages are only known from cookies,
+    # checking them here avoids loading the session
+    return request.method in ('GET', 'HEAD') \
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES \
+        and 'messages' not in request.COOKIES
+
+
+def cache_public_page(view, view_name, params=(), url_kwargs=(), version=None):
+    """
+    Cache the responses of a view for anonymous visitors.
+
+    Responses are stored under the view name, the normalized query
+    ``params``, the ``url_kwargs`` and the value returned by
+    ``version(**url_kwargs)`` if given, so that bumping a version
+    invalidates every page built from the data it covers.
+
+    Versioned pages also get an ETag and a Last-Modified date from their
+    version, and conditional requests are answered with a 304 before
+    looking up the cache.
+    """
+    _cached_views.add(view_name)
+
+    @wraps(view)
+    def cached_view(request, *args, **kwargs):
+        if not _is_cacheable(request):
+            return view(request, *args, **kwargs)
+
+        page_kwargs = {name: kwargs[name] for name in url_kwargs}
+        key_data = urlencode(normalized_params(request, params) +
+                             sorted(page_kwargs.items()))
+        page_version = version(**page_kwargs) if version else ''
+        key = 'page:{}:{}:{}'.format(
+            view_name,
+            page_version,
+            hashlib.md5(key_data.encode()).hexdigest())
+
+        etag, last_modified = None, None
+        if page_version:
+            etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+            last_modified = version_datetime(page_version).timestamp()
+            response = get_conditional_response(request, etag=etag,
+                                                last_modified=last_modified)
+            if response is not None:
+                _count(view_name, 'not_modified')
+                response['ETag'] = etag
+                return response
+
+        response = cache.get(key)
+        if response is not None:
+            _count(view_name, 'hits')
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _count(view_name, 'misses')
+        response = view(request, *args, **kwargs)
+        if etag and response.status_code == 200:
+            response['ETag'] = etag
+            if not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(last_modified)
+        if response.status_code == 200 and not response.cookies:
+            if hasattr(response, 'render') and callable(response.render):
+                response.add_post_render_callback(
+                    lambda r: cache.set(key, r, settings.PAGE_CACHE_TIMEOUT))
+            else:
+                cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return cached_view
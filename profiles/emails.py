@@ -1,17 +1,168 @@
+from functools import lru_cache
+
 from django.core.mail import EmailMultiAlternatives
-from django.template import loader
+from django.template import Context, Engine, Variable, VariableDoesNotExist, engines
+from django.template.base import TextNode, VariableNode
+from django.template.defaulttags import LoadNode
+from django.template.library import SimpleNode
+from django.template.loader_tags import BlockNode, ExtendsNode
+from django.utils.html import conditional_escape
 
 import main_app.settings as settings
 
+from .templatetags.abs_url import abs_url
+
+# delimits the fields in templates pre-rendered with placeholders
+MARK = '\x1f'
+
+
+class Placeholder:
+    """
+    Stands for a context variable when pre-rendering a template: renders
+    as the path of the variable, and so do its attributes.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __getitem__(self, key):
+        if key.startswith('_'):
+            raise KeyError(key)
+        return Placeholder(f'{self.path}.{key}')
+
+    def __str__(self):
+        return f'{MARK}{self.path}{MARK}'
+
+
+@lru_cache(maxsize=None)
+def email_engine():
+    """
+    Template engine of emails, which keeps the compiled templates in memory
+    (including the base templates they extend) even in DEBUG.
+    """
+    default = engines['django'].engine
+    return Engine(dirs=default.dirs, app_dirs=default.app_dirs,
+                  libraries=default.libraries, debug=False)
+
+
+def _literal(expression):
+    return not expression.filters and not isinstance(expression.var, Variable)
+
+
+def _lookup_roots(template):
+    """
+    Return the variables of a template whose attributes it prints, or None
+    if it can not be rendered by substitution: only its text, variables
+    printed without filters and abs_url tags with literal arguments are
+    known to render the same with placeholders.
+    """
+    roots = set()
+
+    def walk(nodelist):
+        for node in nodelist:
+            if isinstance(node, (TextNode, LoadNode)):
+                continue
+            if isinstance(node, VariableNode):
+                expression = node.filter_expression
+                if expression.filters:
+                    return False
+                if isinstance(expression.var, Variable) and len(expression.var.lookups) > 1:
+                    roots.add(expression.var.lookups[0])
+            elif isinstance(node, BlockNode):
+                if not walk(node.nodelist):
+                    return False
+            elif isinstance(node, ExtendsNode):
+                if not _literal(node.parent_name):
+                    return False
+                parent = email_engine().get_template(node.parent_name.var)
+                # the blocks of both, whichever are rendered
+                if not walk(parent.nodelist) or not walk(node.nodelist):
+                    return False
+            elif isinstance(node, SimpleNode) and node.func is abs_url:
+                if node.kwargs or not all(_literal(arg) for arg in node.args):
+                    return False
+            else:
+                return False
+        return True
+
+    return roots if walk(template.nodelist) else None
+
+
+class EmailTemplate:
+    """
+    A compiled email template, rendered once per set of context variables
+    with placeholders so that sending a message only substitutes the
+    values of the recipient into the static text.
+
+    Only templates made of text, plain variables and abs_url tags are
+    rendered this way (see _lookup_roots), the others are rendered
+    normally.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.template = email_engine().get_template(name)
+        self.roots = _lookup_roots(self.template)
+        self.parts = {}
+
+    def _pre_render(self, context):
+        rendered = self.template.render(Context({
+            name: f'{MARK}{name}{MARK}' if isinstance(value, str) else Placeholder(name)
+            for name, value in context.items()}))
+        # static text at even positions, variable paths at odd positions
+        return [part if i % 2 == 0 else Variable(part)
+                for i, part in enumerate(rendered.split(MARK))]
+
+    def _resolve(self, variable, context):
+        # as VariableNode does
+        try:
+            return conditional_escape(variable.resolve(context))
+        except VariableDoesNotExist:
+            return self.template.engine.string_if_invalid
+
+    def _substitute(self, parts, context):
+        return ''.join(part if i % 2 == 0 else self._resolve(part, context)
+                       for i, part in enumerate(parts))
+
+    def render(self, context):
+        # the attributes of strings are not those of their placeholder
+        if self.roots is None or any(isinstance(context.get(root), str)
+                                     for root in self.roots):
+            return self.template.render(Context(context))
 
-def build_email(subject_template_name, email_template_name, html_email_template_name, context=None):
+        names = tuple(sorted(context))
+        if names not in self.parts:
+            self.parts[names] = self._pre_render(context)
+        return self._substitute(self.parts[names], context)
 
-    subject = loader.render_to_string(subject_template_name, context)
+
+@lru_cache(maxsize=None)
+def get_email_template(name):
+    return EmailTemplate(name)
+
+
+def render_email_template(name, context):
+    """
+    Render an email template, substituting the values of ``context``. A
+    request in the context is replaced by its ``base_url``, which is all
+    the email templates use it for.
+    """
+    context = dict(context or {})
+    request = context.pop('request', None)
+    if request is not None:
+        context.setdefault('base_url', request.build_absolute_uri('/'))
+    if 'base_url' in context:
+        context['base_url'] = context['base_url'].rstrip('/')
+    return get_email_template(name).render(context)
+
+
+def build_email(subject_template_name, email_template_name, html_email_template_name, context=None,
+                render=render_email_template):
+
+    subject = render(subject_template_name, context)
     subject = settings.EMAIL_SUBJECT_PREFIX + ''.join(subject.splitlines())
-    body = loader.render_to_string(email_template_name, context)
+    body = render(email_template_name, context)
 
     email_message = EmailMultiAlternatives(subject, body, settings.EMAIL_FROM, None)
-    html_email = loader.render_to_string(html_email_template_name, context)
+    html_email = render(html_email_template_name, context)
     email_message.attach_alternative(html_email, 'text/html')
 
     return email_message
@@ -21,7 +172,8 @@ def user_create_confirm_email(
     request, user, uid, token,
     subject_template_name='registration/signup_confirm_email_subject.txt',
     email_template_name='registration/signup_confirm_email_body.txt',
-    html_email_template_name='registration/signup_confirm_email_body.html'
+    html_email_template_name='registration/signup_confirm_email_body.html',
+    build=build_email
 ):
     context = {
         "request": request,
@@ -30,7 +182,7 @@ def user_create_confirm_email(
         "token": token,
     }
 
-    message = build_email(
+    message = build(
         subject_template_name,
         email_template_name,
         html_email_template_name,
@@ -44,7 +196,8 @@ def user_reset_password_email(
     request, user, uid, token,
     subject_template_name='registration/reset_password_email_subject.txt',
     email_template_name='registration/reset_password_email_body.txt',
-    html_email_template_name='registration/reset_password_email_body.html'
+    html_email_template_name='registration/reset_password_email_body.html',
+    build=build_email
 ):
     context = {
         "request": request,
@@ -53,11 +206,33 @@ def user_reset_password_email(
         "token": token,
     }
 
-    message = build_email(
+    message = build(
         subject_template_name,
         email_template_name,
         html_email_template_name,
         context
     )
     message.to = [user.email]
-    return message
\ No newline at end of file
+    return message
+
+
+def refresh_profile_email(
+    user, base_url,
+    subject_template_name='campaigns/refresh_profile_email_subject.txt',
+    email_template_name='campaigns/refresh_profile_email_body.txt',
+    html_email_template_name='campaigns/refresh_profile_email_body.html',
+    build=build_email
+):
+    context = {
+        "base_url": base_url,
+        "user": user,
+    }
+
+    message = build(
+        subject_template_name,
+        email_template_name,
+        html_email_template_name,
+        context
+    )
+    message.to = [user.email]
+    return message
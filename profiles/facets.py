@@ -0,0 +1,238 @@
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .indexes import ProfileIndex
+from .models import (
+    APPLICATIONS_CHOICES,
+    CAREER_STAGE_CHOICES,
+    METHODS_CHOICES,
+    POSITION_CHOICES,
+    SENIOR,
+    Country,
+)
+from .search import ApplicationLink, MethodLink
+
+# query parameter and label of each facet of the directory
+FACETS = (
+    ('country', 'Country'),
+    ('career_stage', 'Career stage'),
+    ('position', 'Position'),
+    ('methods', 'Methods'),
+    ('applications', 'Applications'),
+    ('grad', 'Graduation year'),
+)
+
+# key, label, first and last year of the ranges of graduation years
+GRAD_YEAR_RANGES = (
+    ('-1989', 'Before 1990', None, 1989),
+    ('1990-1999', '1990 - 1999', 1990, 1999),
+    ('2000-2009', '2000 - 2009', 2000, 2009),
+    ('2010-2014', '2010 - 2014', 2010, 2014),
+    ('2015-2019', '2015 - 2019', 2015, 2019),
+    ('2020-', '2020 or later', 2020, None),
+)
+
+PUBLIC = ('public', None)
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    # before Python 3.10
+    def popcount(bitmap):
+        return bin(bitmap).count('1')
+
+
+def _bitmap(pks):
+    pks = list(pks)
+    if not pks:
+        return 0
+    bits = bytearray(max(pks) // 8 + 1)
+    for pk in pks:
+        bits[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def grad_year_range(grad_year):
+    if len(grad_year) != 4 or not grad_year.isdigit():
+        return None
+    year = int(grad_year)
+    for key, _, first, last in GRAD_YEAR_RANGES:
+        if (first is None or year >= first) and (last is None or year <= last):
+            return key
+    return None
+
+
+def facet_filter(name, values):
+    """
+    Return a filter matching the profiles having one of the values of a
+    facet, as given in the query parameters.
+    """
+    if name == 'country':
+        return Q(country__code__in=values)
+    if name == 'position':
+        return Q(position__in=values)
+    if name == 'career_stage':
+        return Q(career_stage__in=values)
+    if name == 'methods':
+        return Q(pk__in=MethodLink.objects.filter(researchmethod__in=values)
+                                          .values('profile_id'))
+    if name == 'applications':
+        return Q(pk__in=ApplicationLink.objects.filter(researchapplication__in=values)
+                                               .values('profile_id'))
+
+    # graduation years are 4 digit strings, compared as such
+    q = Q(pk__in=[])
+    for key, _, first, last in GRAD_YEAR_RANGES:
+        if key in values:
+            q |= Q(grad_year__gte=f'{first or 0:04}', grad_year__lte=f'{last or 9999:04}')
+    return q
+
+
+def profile_keys(pk, is_public, country_id, position, career_stage, methods,
+                 applications, grad_year):
+    """
+    Return the (facet, value) keys of a profile, as read by FacetIndex.
+    """
+    if not is_public:
+        return set()
+    keys = {PUBLIC, ('country', country_id), ('position', position),
+            ('career_stage', career_stage)}
+    keys |= {('methods', code) for code in methods or ()}
+    keys |= {('applications', code) for code in applications or ()}
+    keys.add(('grad', grad_year_range(grad_year)))
+    return keys
+
+
+class FacetIndex(ProfileIndex):
+    """
+    Bitmaps of the public profiles having each value of each facet, with a
+    bit per profile id, so that counting the profiles matching a value and
+    the current filters is a bitwise and, without a query.
+    """
+    fields = ('pk', 'is_public', 'country_id', 'position', 'career_stage',
+              'methods', 'applications', 'grad_year')
+
+    def __init__(self):
+        super().__init__()
+        self.bitmaps = {}
+        self.profile_keys = {}
+        self.countries = {}
+
+    def build(self, rows):
+        self.countries = Country.objects.in_bulk()
+        self.update(rows)
+
+    def update(self, rows):
+        added, removed = defaultdict(list), defaultdict(list)
+        for row in rows:
+            pk = row[0]
+            old = self.profile_keys.pop(pk, set())
+            new = profile_keys(*row)
+            if new:
+                self.profile_keys[pk] = new
+            for key in old - new:
+                removed[key] += [pk]
+            for key in new - old:
+                added[key] += [pk]
+
+        for key in added.keys() | removed.keys():
+            bitmap = self.bitmaps.get(key, 0) & ~_bitmap(removed[key]) \
+                | _bitmap(added[key])
+            if bitmap:
+                self.bitmaps[key] = bitmap
+            else:
+                self.bitmaps.pop(key, None)
+
+    def union(self, keys):
+        bitmap = 0
+        for key in keys:
+            bitmap |= self.bitmaps.get(key, 0)
+        return bitmap
+
+
+def _selected_keys(index, name, values):
+    if name == 'country':
+        ids = {c.code: pk for pk, c in index.countries.items()}
+        return [(name, ids[code]) for code in values if code in ids]
+    return [(name, value) for value in values]
+
+
+def _facet_values(index, name):
+    """
+    Return the (key, query parameter value, label) of the values of a facet,
+    in display order.
+    """
+    if name == 'country':
+        countries = sorted(index.countries.values(), key=lambda c: c.name)
+        return [((name, c.pk), c.code, c.name) for c in countries]
+    choices = {
+        'career_stage': CAREER_STAGE_CHOICES,
+        'position': POSITION_CHOICES,
+        'methods': METHODS_CHOICES,
+        'applications': APPLICATIONS_CHOICES,
+        'grad': [(key, label) for key, label, _, _ in GRAD_YEAR_RANGES],
+    }[name]
+    return [((name, value), value, label) for value, label in choices]
+
+
+def bitmap_contains(bitmap):
+    """
+    Return a test of the presence of a profile id in a bitmap, cheaper than
+    shifting the bitmap for each id.
+    """
+    bits = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+
+    def contains(pk):
+        i = pk >> 3
+        return i < len(bits) and bool(bits[i] >> (pk & 7) & 1)
+    return contains
+
+
+def facet_counts(matches=None, under_represented=False, senior=False, facets=None,
+                 counts=True):
+    """
+    Return the bitmap of the public profiles matching the directory filters
+    and, for each facet, its values with the number of those profiles
+    having them, or None if not ``counts``. ``matches`` are the ids of the
+    profiles matching the search string, if any.
+
+    The values selected in a facet do not filter its own counts: selecting
+    several values of a facet shows the profiles having any of them.
+    """
+    facets = facets or {}
+    with FacetIndex.current() as index:
+        base = index.bitmaps.get(PUBLIC, 0)
+        if matches is not None:
+            base &= _bitmap(matches)
+        if under_represented:
+            base &= index.union(('country', pk) for pk, c in index.countries.items()
+                                if c.is_under_represented)
+        if senior:
+            base &= index.bitmaps.get(('career_stage', SENIOR), 0)
+
+        selected = {name: index.union(_selected_keys(index, name, values))
+                    for name, values in facets.items() if values}
+
+        total = base
+        for bitmap in selected.values():
+            total &= bitmap
+        if not counts:
+            return total, None
+
+        counts = []
+        for name, label in FACETS:
+            matching = base
+            for other, bitmap in selected.items():
+                if other != name:
+                    matching &= bitmap
+
+            values = []
+            for key, value, value_label in _facet_values(index, name):
+                count = popcount(matching & index.bitmaps.get(key, 0))
+                is_selected = value in facets.get(name, ())
+                if count or is_selected:
+                    values += [{'value': value, 'label': value_label,
+                                'count': count, 'selected': is_selected}]
+            counts += [{'name': name, 'label': label, 'values': values}]
+    return total, counts
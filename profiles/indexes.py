@@ -0,0 +1,117 @@
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.utils import timezone
+
+from . import cache
+from .models import Profile
+
+# profiles saved shortly before an update are read again by the next one,
+# in case their transaction was committed late or the clocks differ
+UPDATE_MARGIN = timedelta(minutes=1)
+# above this number of saved profiles, an index is rebuilt instead
+MAX_UPDATED_PROFILES = 1000
+
+
+class ProfileIndex:
+    """
+    Index of the profiles kept in memory by each process.
+
+    Subclasses read the profile ``fields`` (the primary key first) and
+    apply them in ``update()``. The index of a process is updated from the
+    profiles saved since its last update when the directory version
+    changes, and rebuilt when the countries or indexes version changes,
+    as deleted profiles can not be read back.
+    """
+    fields = ('pk',)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # held while the current index is read or updated
+        cls._lock = threading.Lock()
+        # held while a new index is built
+        cls._build_lock = threading.Lock()
+        cls._current = None
+
+    def __init__(self):
+        self.versions = None
+        self.updated_at = None
+
+    def build(self, rows):
+        self.update(rows)
+
+    def update(self, rows):
+        """
+        Apply the current state of profiles, as tuples of ``fields``.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    @contextmanager
+    def current(cls):
+        """
+        Hold the up to date index of this process, which other threads can
+        not update meanwhile.
+
+        A new index is built without holding it, the other threads using
+        the previous index, if any, until it is swapped in.
+        """
+        versions = (cache.indexes_version(), cache.countries_version(),
+                    cache.directory_version())
+        index = cls._current
+        if index is None or index.versions[:2] != versions[:2]:
+            cls._rebuild(index, versions, wait=index is None)
+
+        with cls._lock:
+            index = cls._current
+            if cls._update(index, versions):
+                yield index
+                return
+        # too many profiles were saved since the last update
+        cls._rebuild(index, versions, wait=True)
+        with cls._lock:
+            yield cls._current
+
+    @classmethod
+    def _rebuild(cls, stale, versions, wait):
+        """
+        Build a new index to replace the stale one, unless another thread
+        already did, or is doing it and wait is false.
+        """
+        if not cls._build_lock.acquire(blocking=wait):
+            return
+        try:
+            if cls._current is not stale:
+                return
+            index = cls()
+            index.versions, index.updated_at = versions, timezone.now()
+            index.build(Profile.objects.order_by().values_list(*cls.fields).iterator())
+            with cls._lock:
+                cls._current = index
+        finally:
+            cls._build_lock.release()
+
+    @classmethod
+    def _update(cls, index, versions):
+        """
+        Update the index from the profiles saved since its last update.
+        Return False if there are too many of them.
+        """
+        if index.versions == versions or index.versions[:2] != versions[:2]:
+            # up to date, or being rebuilt by another thread
+            return True
+
+        now = timezone.now()
+        # a condition on is_public, always true, lets the database use the
+        # (is_public, last_updated) index
+        updated = Profile.objects.filter(
+            is_public__in=(True, False),
+            last_updated__gte=index.updated_at - UPDATE_MARGIN)
+        rows = list(updated.order_by().values_list(*cls.fields)[:MAX_UPDATED_PROFILES + 1])
+        if len(rows) > MAX_UPDATED_PROFILES:
+            return False
+
+        index.update(rows)
+        index.versions, index.updated_at = versions, now
+        return True
@@ -0,0 +1,280 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from django.core import management
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from profiles.models import Profile
+from profiles.sitemaps import STATIC_SITEMAPS, profile_sections
+
+DEFAULT_MIX = 'list=35,detail=30,api=25,sitemap=10'
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in REQUEST_KINDS or not weight.isdigit():
+            raise CommandError(f'Invalid mix {part!r}, expected one of '
+                               f'{", ".join(REQUEST_KINDS)} with a weight, '
+                               f'as in {DEFAULT_MIX}')
+        weights[kind] = int(weight)
+    return weights
+
+
+def _url(name, *args, **params):
+    url = reverse(f'profiles:{name}', args=args)
+    return f'{url}?{urlencode(params)}' if params else url
+
+
+def list_requests(rng, data):
+    term = rng.choice(data['terms'])
+    return rng.choice([
+        ('list', _url('index')),
+        ('list search', _url('index', s=term)),
+        ('list search, under-represented', _url('index', s=term, ur='on')),
+        ('list senior', _url('index', senior='on')),
+        ('list json', _url('index_json', s=term)),
+    ])
+
+
+def detail_requests(rng, data):
+    return 'detail', _url('detail', rng.choice(data['pks']))
+
+
+def api_requests(rng, data):
+    return rng.choice([
+        ('api countries', _url('country-list')),
+        ('api positions', _url('position-list')),
+        ('api methods', _url('method-list')),
+        ('api applications', _url('application-list')),
+        ('api profiles', _url('profile-list', s=rng.choice(data['terms']))),
+        ('api profile', _url('profile-detail', rng.choice(data['pks']))),
+    ])
+
+
+def sitemap_requests(rng, data):
+    section = rng.choice(list(STATIC_SITEMAPS) + data['sections'])
+    return rng.choice([
+        ('sitemap index', _url('sitemap')),
+        ('sitemap section', reverse('profiles:sitemap_section',
+                                    kwargs={'section': section})),
+    ])
+
+
+REQUEST_KINDS = {
+    'list': list_requests,
+    'detail': detail_requests,
+    'api': api_requests,
+    'sitemap': sitemap_requests,
+}
+
+
+def synthetic_requests(number, weights, seed):
+    """
+    Return ``number`` (name, path) requests, each of a kind drawn with the
+    given weights, about the profiles of the database.
+    """
+    profiles = Profile.objects.filter(is_public=True)
+    pks = list(profiles.values_list('pk', flat=True)[:1000])
+    if not pks:
+        raise CommandError('No public profiles, seed some with --profiles.')
+    terms = set()
+    for last_name, keywords in profiles.values_list('last_name', 'keywords')[:200]:
+        terms |= {last_name} | {w for w in keywords.split() if len(w) > 3}
+    data = {
+        'pks': pks,
+        'terms': sorted(terms),
+        'sections': [f'profiles-{section}' for section, _ in profile_sections()],
+    }
+
+    rng = random.Random(seed)
+    kinds = rng.choices(list(weights), list(weights.values()), k=number)
+    return [REQUEST_KINDS[kind](rng, data) for kind in kinds]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Replay a mix of requests against the public pages and report latencies and queries per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int,
+                            help='Wipe the database and seed this number of profiles first (DEBUG only)')
+        parser.add_argument('--seed', default=1, type=int, help='Random seed of the data and the requests')
+        parser.add_argument('--requests', default=1000, type=int, help='Number of synthetic requests')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Weights of the kinds of synthetic requests')
+        parser.add_argument('--replay', help='JSONL file of requests to replay, with a "path" and an optional "name"')
+        parser.add_argument('--record', help='Write the requests to this JSONL file, to replay them later')
+        parser.add_argument('--warmup', default=0, type=int, help='Number of requests sent first and not measured')
+        parser.add_argument('--clear-cache', action='store_true', help='Clear the cache before the run')
+        parser.add_argument('--url', help='Send the requests to a running server, e.g. http://localhost:8000, '
+                                          'instead of the test client')
+        parser.add_argument('--concurrency', default=1, type=int, help='Number of concurrent requests with --url')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='JSON file of earlier results to compare the p95 latencies with')
+        parser.add_argument('--max-regression', type=float,
+                            help='Fail if a p95 latency is this percentage above the baseline')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['profiles'] is not None:
+            management.call_command('refresh_fixtures', profiles=kwargs['profiles'],
+                                    seed=kwargs['seed'], bulk=True, no_dump=True,
+                                    stdout=self.stdout)
+
+        if kwargs['replay']:
+            with open(kwargs['replay']) as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+            requests = [(line.get('name', line['path'].split('?')[0]), line['path'])
+                        for line in lines]
+        else:
+            requests = synthetic_requests(kwargs['requests'], parse_mix(kwargs['mix']),
+                                          kwargs['seed'])
+
+        if kwargs['record']:
+            with open(kwargs['record'], 'w') as f:
+                for name, path in requests:
+                    f.write(json.dumps({'name': name, 'path': path}) + '\n')
+
+        if kwargs['clear_cache']:
+            cache.clear()
+
+        if kwargs['url']:
+            send = self.http_sender(kwargs['url'])
+            concurrency = kwargs['concurrency']
+        else:
+            send = self.client_sender()
+            concurrency = 1
+
+        for _, path in requests[:kwargs['warmup']]:
+            send(path)
+
+        paths = [path for _, path in requests]
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as executor:
+                measures = list(executor.map(send, paths))
+        else:
+            measures = [send(path) for path in paths]
+        duration = time.perf_counter() - start
+
+        results = self.results(requests, measures, duration)
+        self.report(results)
+
+        if kwargs['output']:
+            with open(kwargs['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if kwargs['baseline']:
+            self.compare(results, kwargs['baseline'], kwargs['max_regression'])
+
+    def client_sender(self):
+        client = Client(HTTP_HOST='localhost')
+
+        def send(path):
+            counter = QueryCounter()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(counter))
+                start = time.perf_counter()
+                response = client.get(path)
+                latency = time.perf_counter() - start
+            return latency, response.status_code, counter.queries
+
+        return send
+
+    def http_sender(self, base_url):
+        base_url = base_url.rstrip('/')
+
+        def send(path):
+            start = time.perf_counter()
+            try:
+                with urlopen(base_url + path) as response:
+                    response.read()
+                    status, timing = response.status, response.headers.get('Server-Timing', '')
+            except HTTPError as e:
+                status, timing = e.code, ''
+            latency = time.perf_counter() - start
+            # only known from the requests sampled by the metrics middleware
+            queries = None
+            for metric in timing.split(','):
+                if metric.strip().startswith('db;') and 'queries"' in metric:
+                    queries = int(metric.split('desc="')[1].split()[0])
+            return latency, status, queries
+
+        return send
+
+    def results(self, requests, measures, duration):
+        endpoints = {}
+        for (name, _), measure in zip(requests, measures):
+            endpoints.setdefault(name, []).append(measure)
+
+        results = {
+            'requests': len(measures),
+            'seconds': round(duration, 3),
+            'throughput': round(len(measures) / duration, 1),
+            'endpoints': {},
+        }
+        for name, measures in sorted(endpoints.items()):
+            latencies = [latency * 1000 for latency, _, _ in measures]
+            queries = [q for _, _, q in measures if q is not None]
+            results['endpoints'][name] = {
+                'requests': len(measures),
+                'errors': sum(status >= 400 for _, status, _ in measures),
+                'p50': round(percentile(latencies, 0.5), 2),
+                'p95': round(percentile(latencies, 0.95), 2),
+                'p99': round(percentile(latencies, 0.99), 2),
+                'queries': round(sum(queries) / len(queries), 1) if queries else None,
+                'max_queries': max(queries) if queries else None,
+            }
+        return results
+
+    def report(self, results):
+        self.stdout.write(f'{"endpoint":<32} {"requests":>8} {"errors":>6} {"p50 ms":>8} '
+                          f'{"p95 ms":>8} {"p99 ms":>8} {"queries":>7} {"max":>4}')
+        for name, e in results['endpoints'].items():
+            queries = '-' if e['queries'] is None else e['queries']
+            max_queries = '-' if e['max_queries'] is None else e['max_queries']
+            self.stdout.write(f'{name:<32} {e["requests"]:>8} {e["errors"]:>6} {e["p50"]:>8} '
+                              f'{e["p95"]:>8} {e["p99"]:>8} {queries:>7} {max_queries:>4}')
+        self.stdout.write(f'{results["requests"]} requests in {results["seconds"]}s, '
+                          f'{results["throughput"]} requests per second')
+
+    def compare(self, results, baseline_file, max_regression):
+        with open(baseline_file) as f:
+            baseline = json.load(f)['endpoints']
+
+        regressions = []
+        for name, e in results['endpoints'].items():
+            if name not in baseline or not baseline[name]['p95']:
+                continue
+            change = 100 * (e['p95'] / baseline[name]['p95'] - 1)
+            self.stdout.write(f'{name:<32} p95 {baseline[name]["p95"]:>8} -> {e["p95"]:>8} ms '
+                              f'({change:+.0f}%)')
+            if max_regression is not None and change > max_regression:
+                regressions += [name]
+
+        if regressions:
+            raise CommandError(f'p95 latency regressed by more than {max_regression}% on: '
+                               + ', '.join(regressions))
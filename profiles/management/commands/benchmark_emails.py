@@ -0,0 +1,35 @@
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.template import loader
+from django.test import RequestFactory
+
+from profiles import emails
+from profiles.models import User
+
+
+class Command(BaseCommand):
+    help = 'Measure the number of signup and reset password emails built per second'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', default=1000, type=int, help='Number of emails built per measure')
+
+    def handle(self, *args, **kwargs):
+        number = kwargs['number']
+        request = RequestFactory().get('/', HTTP_HOST='localhost')
+        users = [User(pk=i, email=f'user{i}@example.com', name=f'User {i}')
+                 for i in range(number)]
+
+        # render_to_string is what build_email used for every message
+        for name, build in (('render_to_string', partial(emails.build_email,
+                                                         render=loader.render_to_string)),
+                            ('email engine', emails.build_email)):
+            for email in (emails.user_create_confirm_email,
+                          emails.user_reset_password_email):
+                start = time.perf_counter()
+                for user in users:
+                    email(request, user, f'uid{user.pk}', f'token-{user.pk}', build=build)
+                per_second = number / (time.perf_counter() - start)
+                self.stdout.write(f'{name:>16}, {email.__name__}: '
+                                  f'{per_second:8.0f} emails per second')
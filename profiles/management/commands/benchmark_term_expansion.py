@@ -0,0 +1,46 @@
+import re
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from profiles.models import APPLICATIONS_CHOICES, METHODS_CHOICES
+from profiles.search import expand_term
+
+TERMS = ('vision', 'learning', 'deep', 'multi', 'task', 'france',
+         'robotics', 'language', 'health', 'smith', 'optim', 'theory')
+
+
+def regex_expansion(term):
+    # what ListProfiles used to do for every search term
+    st_regex = re.compile(f'.*{term}.*', re.IGNORECASE)
+    return [x[0] for x in METHODS_CHOICES if st_regex.match(x[1])] \
+        + [x[0] for x in APPLICATIONS_CHOICES if st_regex.match(x[1])]
+
+
+def cold_expansion(term):
+    expand_term.cache_clear()
+    return expand_term(term)
+
+
+class Command(BaseCommand):
+    help = 'Measure the cost of matching search terms against method and application labels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', default=10000, type=int, help='Number of searches timed')
+
+    def handle(self, *args, **kwargs):
+        number = kwargs['number']
+        # a search of a few terms, as typed in the directory
+        searches = [TERMS[i:i + 3] for i in range(0, len(TERMS), 3)]
+
+        for name, expand in (('regex', regex_expansion),
+                             ('lookup (cold)', cold_expansion),
+                             ('lookup (cached)', expand_term)):
+            def run():
+                for search in searches:
+                    for term in search:
+                        expand(term)
+
+            seconds = min(timeit.repeat(run, number=number, repeat=3))
+            per_search = seconds / (number * len(searches)) * 1e6
+            self.stdout.write(f'{name:>16}: {per_search:8.2f} us per search')
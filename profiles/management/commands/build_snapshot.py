@@ -0,0 +1,19 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+import main_app.settings as settings
+from profiles.snapshot import update_snapshot
+
+
+class Command(BaseCommand):
+    help = ('Build the snapshot of the directory searched in browsers, if the '
+            'directory changed since the last one')
+
+    def handle(self, *args, **kwargs):
+        name = update_snapshot()
+        path = os.path.join(settings.SNAPSHOT_ROOT, name)
+        sizes = ', '.join(f'{os.path.basename(p)}: {os.path.getsize(p)} bytes'
+                          for p in (path, path + '.gz', path + '.br')
+                          if os.path.exists(p))
+        self.stdout.write(self.style.SUCCESS(f'Snapshot {name} ({sizes}).'))
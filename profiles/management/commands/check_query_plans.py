@@ -0,0 +1,93 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+
+from profiles import views
+from profiles.facets import FacetIndex
+from profiles.ranking import RankingIndex
+from profiles.models import Profile
+from profiles.pagination import KeysetPaginator, encode_cursor
+from profiles.sitemaps import SECTION_SIZE, ProfilesSitemap
+
+# how each database reports reading a whole table (or subquery alias)
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING)'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'mysql': re.compile(r'"table_name": "(\w+)",\s*"access_type": "ALL"'),
+}
+
+
+def list_page(cursor=None, **params):
+    view = views.ListProfiles()
+    view.setup(RequestFactory().get('/', params))
+    queryset = view.get_queryset()
+    if view.ranked is not None:
+        # searches are ranked in memory, only the page is read
+        return Profile.objects.for_list() \
+                              .filter(pk__in=[pk for pk, _ in queryset[:view.paginate_by]])
+    paginator = KeysetPaginator(queryset, view.paginate_by)
+    return paginator.page_queryset(cursor)
+
+
+def representative_queries():
+    """
+    Yield the name and queryset of the queries run by public pages.
+    """
+    cursor = encode_cursor(Profile(pk=1, publish_date=timezone.now()),
+                           'publish_date')
+
+    yield 'list', list_page()
+    yield 'list, next page', list_page(cursor=cursor)
+    yield 'list, search', list_page(s='vision learning')
+    yield 'list, under-represented', list_page(ur='on')
+    yield 'list, senior', list_page(senior='on')
+    yield 'list, facets', list_page(country='USA', position='Professor', methods='SL',
+                                    applications='CV', grad='2010-2014')
+    for index in (FacetIndex, RankingIndex):
+        yield f'{index.__name__} update', Profile.objects.filter(
+            is_public__in=(True, False), last_updated__gte=timezone.now()) \
+            .order_by().values_list(*index.fields)
+    yield 'detail', Profile.objects.for_detail().filter(pk=1)
+    yield 'sitemap index', Profile.objects.sitemap_sections(SECTION_SIZE)
+    yield 'sitemap section', ProfilesSitemap(0).items()
+    yield 'api countries', views.RepresentedCountriesViewSet.queryset
+    yield 'api positions', views.TopPositionsViewSet.queryset
+    yield 'api methods', views.TopMethodsViewSet.queryset
+    yield 'api applications', views.TopApplicationsViewSet.queryset
+
+
+class Command(BaseCommand):
+    help = 'Report the queries of public pages that read whole tables instead of using an index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ignore-table', action='append', default=[],
+                            help='Table small enough to be scanned (repeatable)')
+        parser.add_argument('--fail', action='store_true',
+                            help='Exit with an error if a query scans a table')
+
+    def handle(self, *args, **kwargs):
+        vendor = connection.vendor
+        if vendor not in FULL_SCAN_PATTERNS:
+            raise CommandError(f'Query plans of {vendor} databases are not supported.')
+
+        options = {'format': 'json'} if vendor == 'mysql' else {}
+        scanning = []
+        for name, queryset in representative_queries():
+            plan = queryset.explain(**options)
+            tables = sorted(set(FULL_SCAN_PATTERNS[vendor].findall(plan))
+                            - set(kwargs['ignore_table']))
+            if tables:
+                scanning += [name]
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: full scan of {", ".join(tables)}'))
+            else:
+                self.stdout.write(f'{name}: OK')
+
+            if kwargs['verbosity'] > 1:
+                self.stdout.write(f'{queryset.query}\n{plan}\n')
+
+        if scanning and kwargs['fail']:
+            raise CommandError(f'{len(scanning)} queries read whole tables.')
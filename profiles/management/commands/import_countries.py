@@ -0,0 +1,99 @@
+import csv
+import os
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+import main_app.settings as settings
+from profiles import cache, search
+from profiles.models import Country
+
+DEFAULT_PATH = os.path.join(settings.BASE_DIR, 'fixtures', 'countries_list.tsv')
+
+
+def read_countries(path, duplicates=None):
+    """
+    Yield the countries of a TSV file with a header line and the columns
+    code, name and is_under_represented (1 or 0). Only the first line of
+    each code is read, the codes of the others are added to duplicates.
+    """
+    seen = set()
+    with open(path, newline='', encoding='utf8') as tsv_file:
+        rows = csv.reader(tsv_file, delimiter='\t', quotechar='|')
+        next(rows, None)
+        for row in rows:
+            if not row:
+                continue
+            if row[0] in seen:
+                if duplicates is not None:
+                    duplicates.append(row[0])
+                continue
+            seen.add(row[0])
+            yield Country(code=row[0],
+                          name=row[1],
+                          is_under_represented=(row[2] == '1'))
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+class Command(BaseCommand):
+    help = 'Create or update countries from a TSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH, help='TSV file to import')
+        parser.add_argument('--batch-size', default=500, type=int, help='Number of countries written per query')
+
+    def handle(self, *args, **kwargs):
+        if not os.path.exists(kwargs['path']):
+            raise CommandError(f'{kwargs["path"]} does not exist.')
+
+        inserted, updated, unchanged = 0, 0, 0
+        renamed, duplicates = [], []
+        countries = read_countries(kwargs['path'], duplicates)
+        with transaction.atomic():
+            for batch in batches(countries, kwargs['batch_size']):
+                stored = Country.objects.in_bulk([c.code for c in batch],
+                                                 field_name='code')
+
+                new, changed = [], []
+                for country in batch:
+                    current = stored.get(country.code)
+                    if current is None:
+                        new += [country]
+                    elif (current.name, current.is_under_represented) \
+                            != (country.name, country.is_under_represented):
+                        if current.name != country.name:
+                            renamed += [current.pk]
+                        current.name = country.name
+                        current.is_under_represented = country.is_under_represented
+                        changed += [current]
+                    else:
+                        unchanged += 1
+
+                Country.objects.bulk_create(new)
+                Country.objects.bulk_update(changed, ['name', 'is_under_represented'])
+                inserted += len(new)
+                updated += len(changed)
+
+            # bulk queries do not send the signals keeping these up to date
+            for country in Country.objects.filter(pk__in=renamed):
+                for profile in country.profile_set.select_related('country'):
+                    search.index_profile(profile)
+
+        if inserted or updated:
+            cache.bump_countries_version()
+        if updated:
+            cache.bump_directory_version()
+
+        if duplicates:
+            self.stdout.write(self.style.WARNING(
+                f'Skipped the duplicate lines of {", ".join(sorted(set(duplicates)))}.'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{inserted} inserted, {updated} updated, {unchanged} unchanged.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from profiles.search import rebuild_index, rebuild_research_fields
+
+
+class Command(BaseCommand):
+    help = 'Re-create the directory search index and research relations from all profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=1000, type=int, help='Number of index entries written per query')
+
+    def handle(self, *args, **kwargs):
+        rebuild_research_fields(batch_size=kwargs['batch_size'])
+        count = rebuild_index(batch_size=kwargs['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} profiles.'))
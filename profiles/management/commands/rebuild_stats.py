@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from profiles.stats import rebuild_career_stages, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Re-compute the career stages and the public profile counters served by the API'
+
+    def handle(self, *args, **kwargs):
+        # counted by career stage, which fixtures may not have
+        rebuild_career_stages()
+        count = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} counters.'))
@@ -1,28 +1,85 @@
 import random
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
 from django.core import management
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 import main_app.settings as settings
+from profiles import cache, search, sitemaps, stats
 from profiles.models import Country, User, Profile
 from profiles.models import (
     METHODS_CHOICES,
     APPLICATIONS_CHOICES,
     MONTHS_CHOICES,
     POSITION_CHOICES,
+    career_stage,
 )
 
+KEYWORDS = 'My long keyword that I want to see if it gets cut correctly for small screen sizes, Another long annoying keyword'
+
+
+def generate_accounts(seed, start, stop, names, surnames, institutions, n_countries):
+    """
+    Return the user and profile fields of accounts start to stop.
+
+    Each account has its own random generator, so the accounts only depend
+    on the seed, whatever the batch size or number of workers.
+    """
+    accounts = []
+    for i in range(start, stop):
+        rng = random.Random(f'{seed}-{i}')
+        name = rng.choice(names)
+        surname = rng.choice(surnames)
+        fullname = name + ' ' + surname
+        institution = rng.choice(institutions)
+        slug = fullname.lower().replace(' ', '-')
+        email = f'{slug}.{i}@' + institution.lower().replace(' ', '-') + '.edu'
+
+        user = {
+            'username': f'{name}{surname}{i}',
+            'name': fullname,
+            'email': email,
+        }
+        profile = {
+            'first_name': name,
+            'last_name': surname,
+            'contact_email': email,
+            'webpage': 'http://' + slug + '.me',
+            'institution': institution,
+            'country': rng.randrange(n_countries),
+            'position': rng.choice(POSITION_CHOICES)[0],
+            'grad_month': rng.choice(MONTHS_CHOICES)[0],
+            'grad_year': str(rng.randint(1950, 2020)),
+            'methods': rng.choice(METHODS_CHOICES)[0],
+            'applications': rng.choice(APPLICATIONS_CHOICES)[0],
+            'keywords': KEYWORDS,
+            'is_public': rng.random() > 0.2,
+        }
+        accounts += [(user, profile)]
+    return accounts
+
+
 class Command(BaseCommand):
     help = 'Re-create fixtures based on models'
 
     def add_arguments(self, parser):
         parser.add_argument('--seed', default=1, type=int, help='Random Seed')
         parser.add_argument('--profiles', default=10, type=int, help='Number of profiles to be created')
+        parser.add_argument('--bulk', action='store_true', help='Insert accounts in batches, for large datasets')
+        parser.add_argument('--batch-size', default=1000, type=int, help='Number of accounts per batch in bulk mode')
+        parser.add_argument('--workers', default=1, type=int, help='Number of processes generating accounts in bulk mode')
+        parser.add_argument('--no-dump', action='store_true', help='Do not write profiles/fixtures/database.json')
 
     def handle(self, *args, **kwargs):
 
         if not settings.DEBUG:
             raise CommandError('Please, do not run this command on production mode. It will wipe the database.')
 
+        if kwargs['batch_size'] < 1 or kwargs['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be positive.')
+
         random.seed(kwargs['seed'])
 
         management.call_command(
@@ -30,6 +87,7 @@ class Command(BaseCommand):
             no_input=True,
             interactive=False,
         )
+        search.create_research_choices()
 
         countries_data = []
         with open('profiles/fixtures/countries.txt') as f:
@@ -37,17 +95,17 @@ class Command(BaseCommand):
 
         Country.objects.all().delete()
 
-        countries = []
-        for name, code in countries_data:
-            is_under_represented = random.random() > 0.5
-
-            country =  Country(
+        countries = [
+            Country(
                 code=code,
                 name=name,
-                is_under_represented=is_under_represented,
+                is_under_represented=random.random() > 0.5,
             )
-            country.save()
-            countries += [country]
+            for name, code in countries_data
+        ]
+        Country.objects.bulk_create(countries)
+        # primary keys are not set by bulk_create on every database
+        countries = list(Country.objects.order_by('pk'))
 
 
         institutions = []
@@ -69,6 +127,30 @@ class Command(BaseCommand):
         # Accounts
 
         n_profiles = kwargs['profiles']
+        if kwargs['bulk']:
+            self.create_accounts_in_bulk(kwargs, countries, names, surnames, institutions)
+        else:
+            self.create_accounts(n_profiles, countries, names, surnames, institutions)
+
+        # neither flush nor bulk queries send the signals bumping these
+        cache.bump_countries_version()
+        cache.bump_directory_version()
+        cache.bump_indexes_version()
+        sitemaps.invalidate_profile_sections()
+
+        if kwargs['no_dump']:
+            return
+
+        management.call_command(
+            'dumpdata',
+            'profiles',
+            'auth',
+            natural_primary=True,
+            natural_foreign=True,
+            output='profiles/fixtures/database.json'
+        )
+
+    def create_accounts(self, n_profiles, countries, names, surnames, institutions):
         profiles = []
         for _ in range(n_profiles):
 
@@ -93,7 +175,7 @@ class Command(BaseCommand):
                 email=email,
                 password='user'
             )
-            user.save()     
+            user.save()
 
             profile = Profile(
                 user=user,
@@ -108,18 +190,50 @@ class Command(BaseCommand):
                 grad_year=grad_year,
                 methods=methods,
                 applications=applications,
-                keywords='My long keyword that I want to see if it gets cut correctly for small screen sizes, Another long annoying keyword',
+                keywords=KEYWORDS,
                 is_public=random.random() > 0.2,
             )
             profiles += [profile]
             profile.save()
 
+    def create_accounts_in_bulk(self, kwargs, countries, names, surnames, institutions):
+        n_profiles = kwargs['profiles']
+        batch_size = kwargs['batch_size']
+
+        n_countries = len(countries)
+        ranges = [(start, min(start + batch_size, n_profiles))
+                  for start in range(0, n_profiles, batch_size)]
+        arguments = [(kwargs['seed'], start, stop, names, surnames, institutions, n_countries)
+                     for start, stop in ranges]
+
+        with ProcessPoolExecutor(kwargs['workers']) as executor, transaction.atomic():
+            if kwargs['workers'] > 1:
+                batches = executor.map(generate_accounts, *zip(*arguments))
+            else:
+                batches = (generate_accounts(*a) for a in arguments)
+
+            # hashed once for every batch
+            password = make_password('user')
+            inserted = 0
+            for accounts in batches:
+                self.insert_accounts(accounts, countries, password)
+                inserted += len(accounts)
+                self.stdout.write(f'{inserted}/{n_profiles} accounts inserted')
+
+            # bulk queries do not send the signals keeping these up to date
+            search.rebuild_research_fields()
+            search.rebuild_index()
+            stats.rebuild_counters()
+
+    def insert_accounts(self, accounts, countries, password):
+        users = User.objects.create_users([user for user, _ in accounts], password=password,
+                                          hashed=True)
+        user_ids = dict(User.objects.filter(username__in=[u.username for u in users])
+                                    .values_list('username', 'pk'))
 
-        management.call_command(
-            'dumpdata',
-            'profiles',
-            'auth',
-            natural_primary=True,
-            natural_foreign=True,
-            output='profiles/fixtures/database.json'
-        )
\ No newline at end of file
+        profiles = []
+        for user, profile in accounts:
+            profile = dict(profile, country=countries[profile['country']],
+                           career_stage=career_stage(profile['position']))
+            profiles += [Profile(user_id=user_ids[user['username']], **profile)]
+        Profile.objects.bulk_create(profiles)
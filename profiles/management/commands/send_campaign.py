@@ -0,0 +1,74 @@
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+
+from profiles import outbox
+from profiles.emails import refresh_profile_email
+from profiles.models import User
+
+TEMPLATES = {
+    'refresh_profile': refresh_profile_email,
+}
+
+
+def parse_lookups(lookups):
+    """
+    Turn ``field=value`` arguments into queryset filter keyword arguments.
+    """
+    filters = {}
+    for lookup in lookups:
+        field, sep, value = lookup.partition('=')
+        if not sep:
+            raise CommandError(f'"{lookup}" is not of the form field=value.')
+        filters[field] = {'true': True, 'false': False}.get(value.lower(), value)
+    return filters
+
+
+class Command(BaseCommand):
+    help = 'Email a campaign to the active users matching the filters, resuming where a previous run stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign', help='Name of the campaign, each user receives it once')
+        parser.add_argument('--template', default='refresh_profile', choices=sorted(TEMPLATES),
+                            help='Email sent')
+        parser.add_argument('--filter', action='append', default=[], metavar='FIELD=VALUE',
+                            help='User lookup, e.g. profile__country__code=FRA (repeatable)')
+        parser.add_argument('--exclude', action='append', default=[], metavar='FIELD=VALUE',
+                            help='User lookup of the users to leave out (repeatable)')
+        parser.add_argument('--base-url', help='Address of the site in links, the current Site by default')
+        parser.add_argument('--rate', type=float, help='Emails per second, EMAIL_RATE_LIMIT by default')
+        parser.add_argument('--batch-size', default=100, type=int, help='Number of emails claimed at once, their outcome being saved one by one')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the recipients')
+
+    def handle(self, *args, **kwargs):
+        campaign = kwargs['campaign']
+        try:
+            users = (User.objects.filter(is_active=True)
+                                 .filter(**parse_lookups(kwargs['filter']))
+                                 .exclude(**parse_lookups(kwargs['exclude'])))
+            count = users.exclude(outbox_emails__campaign=campaign).count()
+        except Exception as e:
+            raise CommandError(f'Invalid filter: {e}')
+
+        if kwargs['dry_run']:
+            self.stdout.write(f'{count} users to email.')
+            return
+
+        base_url = kwargs['base_url'] or f'https://{Site.objects.get_current().domain}'
+        build = TEMPLATES[kwargs['template']]
+        queued = outbox.enqueue_campaign(campaign, users,
+                                         lambda user: build(user, base_url))
+        self.stdout.write(f'{queued} emails queued.')
+
+        sent, failed = 0, 0
+        while True:
+            batch_sent, batch_failed = outbox.drain(kwargs['batch_size'],
+                                                    campaign=campaign,
+                                                    rate=kwargs['rate'])
+            if not batch_sent and not batch_failed:
+                break
+            sent += batch_sent
+            failed += batch_failed
+            self.stdout.write(f'{sent} sent, {failed} failed.')
+
+        # failed emails are retried later by send_outbox
+        self.stdout.write(self.style.SUCCESS(f'Campaign {campaign}: {sent} sent, {failed} failed.'))
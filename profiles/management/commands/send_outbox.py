@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from profiles import outbox
+
+
+class Command(BaseCommand):
+    help = 'Send the emails waiting in the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', default=100, type=int, help='Number of emails sent per pass')
+        parser.add_argument('--max-attempts', default=5, type=int, help='Number of attempts before an email is marked as failed')
+        parser.add_argument('--backoff', default=60, type=int, help='Seconds before the first retry, doubled on each attempt')
+        parser.add_argument('--loop', action='store_true', help='Keep draining the outbox until interrupted')
+        parser.add_argument('--interval', default=10, type=int, help='Seconds between passes with --loop')
+
+    def handle(self, *args, **kwargs):
+        while True:
+            try:
+                sent, failed = outbox.drain(kwargs['limit'],
+                                            kwargs['max_attempts'],
+                                            kwargs['backoff'])
+            except Exception as e:
+                # e.g. the mail server can not be reached, nothing was sent
+                if not kwargs['loop']:
+                    raise
+                self.stderr.write(f'Could not drain the outbox: {e!r}')
+                sent, failed = 0, 0
+
+            if sent or failed or not kwargs['loop']:
+                self.stdout.write(f'{sent} sent, {failed} failed.')
+
+            if not kwargs['loop']:
+                break
+            # a full pass means more emails may be due right away
+            if sent + failed < kwargs['limit']:
+                time.sleep(kwargs['interval'])
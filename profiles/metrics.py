@@ -0,0 +1,160 @@
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from copy import deepcopy
+
+from django.conf import settings
+from django.core.cache import cache
+
+# upper bounds of the histogram buckets, the last bucket has no bound
+TIME_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+HISTOGRAMS = {
+    'wall_ms': TIME_BUCKETS,
+    'db_ms': TIME_BUCKETS,
+    'queries': COUNT_BUCKETS,
+    'template_ms': TIME_BUCKETS,
+}
+
+PROCESS_KEY = 'metrics:process:{}'
+# the processes publishing metrics, with the time they last did
+PROCESSES_KEY = 'metrics:processes'
+# snapshots of processes which stopped publishing are eventually dropped
+PROCESS_TIMEOUT = 60 * 60 * 24
+
+_process = f'{socket.gethostname()}-{os.getpid()}'
+_lock = threading.Lock()
+_views = {}
+_published_at = 0
+
+
+def _new_view():
+    view = {'requests': 0, 'cache': {}}
+    for name, bounds in HISTOGRAMS.items():
+        view[name] = {'buckets': [0] * (len(bounds) + 1), 'sum': 0, 'max': 0}
+    return view
+
+
+def _add(histogram, bounds, value):
+    histogram['buckets'][bisect_left(bounds, value)] += 1
+    histogram['sum'] += value
+    histogram['max'] = max(histogram['max'], value)
+
+
+def record(view_name, sample, cache_outcome=None):
+    """
+    Add the measures of a request, a dict with a value for each of the
+    HISTOGRAMS, to the metrics of its view in this process.
+    """
+    with _lock:
+        view = _views.get(view_name)
+        if view is None:
+            view = _views[view_name] = _new_view()
+        view['requests'] += 1
+        for name, bounds in HISTOGRAMS.items():
+            _add(view[name], bounds, sample[name])
+        if cache_outcome:
+            view['cache'][cache_outcome] = view['cache'].get(cache_outcome, 0) + 1
+    publish()
+
+
+def publish(force=False):
+    """
+    Copy the metrics of this process to the cache, at most every
+    METRICS_PUBLISH_INTERVAL seconds, so that the metrics endpoint can
+    gather the ones of every process.
+    """
+    global _published_at
+    now = time.monotonic()
+    with _lock:
+        if not force and now - _published_at < settings.METRICS_PUBLISH_INTERVAL:
+            return
+        _published_at = now
+        snapshot = deepcopy(_views)
+
+    cache.set(PROCESS_KEY.format(_process), snapshot, PROCESS_TIMEOUT)
+    # written on each publication, in case a concurrent one overwrote it
+    processes = _live_processes()
+    processes[_process] = time.time()
+    cache.set(PROCESSES_KEY, processes, None)
+
+
+def _live_processes():
+    # the processes which published within PROCESS_TIMEOUT, as the
+    # snapshots of the others expired
+    expired = time.time() - PROCESS_TIMEOUT
+    return {process: published_at
+            for process, published_at in cache.get(PROCESSES_KEY, {}).items()
+            if published_at > expired}
+
+
+def _merge(total, view):
+    total['requests'] += view['requests']
+    for outcome, count in view['cache'].items():
+        total['cache'][outcome] = total['cache'].get(outcome, 0) + count
+    for name in HISTOGRAMS:
+        histogram = total[name]
+        histogram['buckets'] = [a + b for a, b in zip(histogram['buckets'],
+                                                      view[name]['buckets'])]
+        histogram['sum'] += view[name]['sum']
+        histogram['max'] = max(histogram['max'], view[name]['max'])
+
+
+def _quantile(histogram, bounds, count, q):
+    # the upper bound of the bucket holding the quantile
+    rank = q * count
+    seen = 0
+    for bound, n in zip(bounds, histogram['buckets']):
+        seen += n
+        if seen >= rank:
+            return min(bound, histogram['max'])
+    return histogram['max']
+
+
+def _summary(histogram, bounds, count):
+    labels = [f'<={bound}' for bound in bounds] + [f'>{bounds[-1]}']
+    return {
+        'mean': round(histogram['sum'] / count, 3),
+        'p50': _quantile(histogram, bounds, count, 0.5),
+        'p95': _quantile(histogram, bounds, count, 0.95),
+        'p99': _quantile(histogram, bounds, count, 0.99),
+        'max': round(histogram['max'], 3),
+        'buckets': dict(zip(labels, histogram['buckets'])),
+    }
+
+
+def collect():
+    """
+    Return the metrics of each view, merged over every process, with
+    quantiles estimated from the histograms.
+    """
+    publish(force=True)
+    processes = _live_processes()
+    snapshots = cache.get_many([PROCESS_KEY.format(p) for p in processes])
+
+    views = {}
+    for snapshot in snapshots.values():
+        for view_name, view in snapshot.items():
+            _merge(views.setdefault(view_name, _new_view()), view)
+
+    metrics = {}
+    for view_name, view in sorted(views.items()):
+        metrics[view_name] = {'requests': view['requests'], 'cache': view['cache']}
+        for name, bounds in HISTOGRAMS.items():
+            metrics[view_name][name] = _summary(view[name], bounds, view['requests'])
+    return {'processes': len(snapshots), 'views': metrics}
+
+
+def reset():
+    """
+    Forget the metrics of this process and the published ones.
+    """
+    global _published_at
+    with _lock:
+        _views.clear()
+        _published_at = 0
+    processes = cache.get(PROCESSES_KEY, {})
+    cache.delete_many([PROCESS_KEY.format(p) for p in processes] + [PROCESSES_KEY])
@@ -0,0 +1,146 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics, routers
+from .cache import countries_version, directory_version, version_datetime
+
+CACHE_OUTCOMES = {'HIT': 'hits', 'MISS': 'misses'}
+
+# views only reading public data
+REPLICA_VIEWS = {
+    'profiles:index',
+    'profiles:index_json',
+    'profiles:detail',
+    'profiles:snapshot',
+    'profiles:sitemap',
+    'profiles:sitemap_section',
+    'profiles:country-list',
+    'profiles:position-list',
+    'profiles:career_stage-list',
+    'profiles:method-list',
+    'profiles:application-list',
+    'profiles:profile-list',
+    'profiles:profile-detail',
+}
+# set on the responses to write requests, until the replica caught up
+PRIMARY_COOKIE = 'read_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class RequestSample:
+    """
+    Time spent by a request in the database and in rendering templates.
+    """
+    def __init__(self):
+        self.db = 0
+        self.queries = 0
+        self.templates = 0
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+    def template_rendered(self, start):
+        def callback(response):
+            self.templates += time.perf_counter() - start
+        return callback
+
+
+class MetricsMiddleware:
+    """
+    Measure a sample of the requests, METRICS_SAMPLE_RATE of them, and add
+    their wall, database and template rendering times, query count and
+    page cache outcome to the metrics of their view (see profiles.metrics).
+
+    Measured responses get a Server-Timing header with the same figures.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.random = random.Random()
+
+    def __call__(self, request):
+        rate = settings.METRICS_SAMPLE_RATE
+        if not rate or self.random.random() >= rate:
+            return self.get_response(request)
+
+        sample = request.metrics_sample = RequestSample()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sample.execute))
+            response = self.get_response(request)
+        wall = time.perf_counter() - start
+
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        cache_outcome = CACHE_OUTCOMES.get(response.get('X-Cache'))
+        if cache_outcome is None and response.status_code == 304:
+            cache_outcome = 'not_modified'
+
+        metrics.record(view_name, {
+            'wall_ms': wall * 1000,
+            'db_ms': sample.db * 1000,
+            'queries': sample.queries,
+            'template_ms': sample.templates * 1000,
+        }, cache_outcome)
+
+        timings = [
+            f'app;dur={wall * 1000:.1f}',
+            f'db;dur={sample.db * 1000:.1f};desc="{sample.queries} queries"',
+            f'tpl;dur={sample.templates * 1000:.1f}',
+        ]
+        if cache_outcome:
+            timings += [f'cache;desc="{cache_outcome}"']
+        response['Server-Timing'] = ', '.join(timings)
+        return response
+
+    def process_template_response(self, request, response):
+        sample = getattr(request, 'metrics_sample', None)
+        if sample is not None:
+            response.add_post_render_callback(
+                sample.template_rendered(time.perf_counter()))
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Read from the replica database, if there is one, in the public views
+    of REPLICA_VIEWS. Users read from the default database for
+    DB_REPLICA_LAG seconds after their own write requests, and everyone
+    after the directory changed, so that pages are not rendered and cached
+    from rows the replica did not receive yet.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not routers.has_replica():
+            return self.get_response(request)
+
+        with ExitStack() as stack:
+            request.replica_reads = stack
+            response = self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=settings.DB_REPLICA_LAG,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stack = getattr(request, 'replica_reads', None)
+        if stack is None or request.resolver_match.view_name not in REPLICA_VIEWS \
+                or request.COOKIES.get(PRIMARY_COOKIE):
+            return None
+        # versions are dated to the second
+        changed = version_datetime(f'{directory_version()}.{countries_version()}')
+        if time.time() - changed.timestamp() > settings.DB_REPLICA_LAG + 1:
+            stack.enter_context(routers.replica_reads())
+        return None
@@ -0,0 +1,77 @@
+# Generated by Django 2.2.18 on 2026-10-18 02:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import multiselectfield.db.fields
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('username', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('is_active', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('is_superuser', models.BooleanField(default=False)),
+                ('is_staff', models.BooleanField(default=False)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.Group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.Permission', verbose_name='user permissions')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Country',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=3, unique=True)),
+                ('name', models.CharField(max_length=60)),
+                ('is_under_represented', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name_plural': 'countries',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_public', models.BooleanField(default=False)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('contact_email', models.EmailField(blank=True, max_length=254)),
+                ('webpage', models.URLField(blank=True)),
+                ('institution', models.CharField(max_length=100)),
+                ('position', models.CharField(blank=True, choices=[('Undergraduate student', 'Undergraduate student'), ('Masters student', 'Masters student'), ('Predoc/postbac fellow/resident', 'Predoc/postbac fellow/resident'), ('PhD student', 'PhD student'), ('Post-doctoral researcher', 'Post-doctoral researcher'), ('Research scientist/engineer', 'Research scientist/engineer'), ('Senior research scientist/engineer', 'Senior research scientist/engineer'), ('Data scientist/engineer', 'Data scientist/engineer'), ('Senior data scientist/engineer', 'Senior data scientist/engineer'), ('Software engineer', 'Software engineer'), ('Lecturer', 'Lecturer'), ('Assistant Professor', 'Assistant Professor'), ('Associate Professor', 'Associate Professor'), ('Professor', 'Professor'), ('Program/product manager', 'Program/product manager'), ('Director/founder/advisor', 'Director/founder/advisor')], max_length=50)),
+                ('grad_month', models.CharField(blank=True, choices=[('01', 'January'), ('02', 'February'), ('03', 'March'), ('04', 'April'), ('05', 'May'), ('06', 'June'), ('07', 'July'), ('08', 'August'), ('09', 'September'), ('10', 'October'), ('11', 'November'), ('12', 'December')], max_length=2)),
+                ('grad_year', models.CharField(blank=True, max_length=4)),
+                ('methods', multiselectfield.db.fields.MultiSelectField(blank=True, choices=[('SL', 'Supervised learning'), ('UL', 'Unsupervised learning'), ('ALG', 'Algorithms: active, online, multi-task learning, etc.'), ('DL', 'Deep learning'), ('RL', 'Reinforcement learning and planning'), ('REL', 'Representation learning'), ('PR', 'Probabilistic methods'), ('OPT', 'Optimization methods'), ('LT', 'Learning theory'), ('TR', 'Trustworthy ML'), ('HAI', 'Humans and AI')], max_length=36)),
+                ('applications', multiselectfield.db.fields.MultiSelectField(blank=True, choices=[('AUD', 'Audio and Speech Processing'), ('CV', 'Computer Vision'), ('NLP', 'Natural Language Processing (NLP)'), ('TS', 'Time Series Analysis'), ('ROB', 'Robotics'), ('CB', 'Computational biology'), ('NS', 'Neuroscience'), ('PS', 'Physical sciences'), ('HC', 'Healthcare'), ('SG', 'Social good'), ('CS', 'Climate science'), ('DEP', 'Deployment of AI/ML systems')], max_length=39)),
+                ('keywords', models.CharField(blank=True, max_length=250)),
+                ('publish_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='profiles.Country')),
+                ('user', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['last_name', 'institution', 'last_updated'],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 2.2.18 on 2026-10-18 02:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResearchApplication',
+            fields=[
+                ('code', models.CharField(choices=[('AUD', 'Audio and Speech Processing'), ('CV', 'Computer Vision'), ('NLP', 'Natural Language Processing (NLP)'), ('TS', 'Time Series Analysis'), ('ROB', 'Robotics'), ('CB', 'Computational biology'), ('NS', 'Neuroscience'), ('PS', 'Physical sciences'), ('HC', 'Healthcare'), ('SG', 'Social good'), ('CS', 'Climate science'), ('DEP', 'Deployment of AI/ML systems')], max_length=3, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResearchMethod',
+            fields=[
+                ('code', models.CharField(choices=[('SL', 'Supervised learning'), ('UL', 'Unsupervised learning'), ('ALG', 'Algorithms: active, online, multi-task learning, etc.'), ('DL', 'Deep learning'), ('RL', 'Reinforcement learning and planning'), ('REL', 'Representation learning'), ('PR', 'Probabilistic methods'), ('OPT', 'Optimization methods'), ('LT', 'Learning theory'), ('TR', 'Trustworthy ML'), ('HAI', 'Humans and AI')], max_length=3, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProfileCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('country', 'Country code'), ('position', 'Position'), ('method', 'Method code'), ('application', 'Application code')], max_length=20)),
+                ('key', models.CharField(blank=True, max_length=50)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('kind', 'key')},
+            },
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='research_applications',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='profiles', to='profiles.ResearchApplication'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='research_methods',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='profiles', to='profiles.ResearchMethod'),
+        ),
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(db_index=True, max_length=50)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='profiles.Profile')),
+            ],
+            options={
+                'unique_together': {('token', 'profile')},
+            },
+        ),
+    ]
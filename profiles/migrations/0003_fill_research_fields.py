@@ -0,0 +1,108 @@
+import re
+
+from django.db import migrations
+from django.db.models import Count
+
+# the choices as of this migration, which must not change with the models
+METHODS = ('SL', 'UL', 'ALG', 'DL', 'RL', 'REL', 'PR', 'OPT', 'LT', 'TR', 'HAI')
+APPLICATIONS = ('AUD', 'CV', 'NLP', 'TS', 'ROB', 'CB', 'NS', 'PS', 'HC', 'SG',
+                'CS', 'DEP')
+
+# profiles.search tokenization as of this migration
+TOKEN_MAX_LENGTH = 50
+_word_re = re.compile(r'\w+')
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [w[:TOKEN_MAX_LENGTH] for w in _word_re.findall(text.lower())]
+
+
+def fill_research_fields(apps, schema_editor):
+    ResearchMethod = apps.get_model('profiles', 'ResearchMethod')
+    ResearchApplication = apps.get_model('profiles', 'ResearchApplication')
+    Profile = apps.get_model('profiles', 'Profile')
+
+    ResearchMethod.objects.bulk_create(
+        ResearchMethod(code=code) for code in METHODS)
+    ResearchApplication.objects.bulk_create(
+        ResearchApplication(code=code) for code in APPLICATIONS)
+
+    MethodLink = Profile.research_methods.through
+    ApplicationLink = Profile.research_applications.through
+
+    method_links, application_links = [], []
+    for profile in Profile.objects.only('methods', 'applications').iterator():
+        method_links += [
+            MethodLink(profile_id=profile.pk, researchmethod_id=code)
+            for code in profile.methods if code in METHODS]
+        application_links += [
+            ApplicationLink(profile_id=profile.pk, researchapplication_id=code)
+            for code in profile.applications if code in APPLICATIONS]
+
+    MethodLink.objects.bulk_create(method_links)
+    ApplicationLink.objects.bulk_create(application_links)
+
+
+def clear_research_fields(apps, schema_editor):
+    apps.get_model('profiles', 'ResearchMethod').objects.all().delete()
+    apps.get_model('profiles', 'ResearchApplication').objects.all().delete()
+
+
+def fill_search_index(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    SearchToken = apps.get_model('profiles', 'SearchToken')
+
+    tokens = []
+    profiles = Profile.objects.select_related('country').order_by('pk')
+    for profile in profiles.iterator():
+        words = set()
+        for field in (profile.first_name, profile.last_name, profile.institution,
+                      profile.position, profile.country.name, profile.keywords):
+            words.update(tokenize(field))
+        tokens += [SearchToken(profile_id=profile.pk, token=word) for word in words]
+    SearchToken.objects.bulk_create(tokens)
+
+
+def clear_search_index(apps, schema_editor):
+    apps.get_model('profiles', 'SearchToken').objects.all().delete()
+
+
+def fill_counters(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    ProfileCounter = apps.get_model('profiles', 'ProfileCounter')
+
+    public = Profile.objects.filter(is_public=True).order_by()
+    public_methods = Profile.research_methods.through.objects \
+                                                     .filter(profile__is_public=True)
+    public_applications = Profile.research_applications.through.objects \
+                                                     .filter(profile__is_public=True)
+    aggregates = (
+        ('country', public.values_list('country__code')),
+        ('position', public.values_list('position')),
+        ('method', public_methods.values_list('researchmethod')),
+        ('application', public_applications.values_list('researchapplication')),
+    )
+    counters = []
+    for kind, values in aggregates:
+        counters += [ProfileCounter(kind=kind, key=key, count=count)
+                     for key, count in values.order_by().annotate(Count('id'))]
+    ProfileCounter.objects.bulk_create(counters)
+
+
+def clear_counters(apps, schema_editor):
+    apps.get_model('profiles', 'ProfileCounter').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0002_search_stats_research_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_research_fields, clear_research_fields),
+        migrations.RunPython(fill_search_index, clear_search_index),
+        migrations.RunPython(fill_counters, clear_counters),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.18 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0003_fill_research_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(fields=['is_under_represented'], name='country_ur_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['is_public', 'publish_date', 'id'], name='profile_public_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['is_public', 'last_updated'], name='profile_public_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['country', 'is_public'], name='profile_country_public_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['position', 'is_public'], name='profile_position_public_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['last_name', 'institution', 'last_updated'], name='profile_ordering_idx'),
+        ),
+    ]
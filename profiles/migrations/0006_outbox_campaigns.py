@@ -0,0 +1,29 @@
+# Generated by Django 2.2.18 on 2026-10-18 02:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0005_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxemail',
+            name='campaign',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='outboxemail',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='outbox_emails', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='outboxemail',
+            unique_together={('campaign', 'user')},
+        ),
+    ]
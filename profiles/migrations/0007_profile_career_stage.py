@@ -0,0 +1,82 @@
+# Generated by Django 2.2.18 on 2026-10-18 02:33
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# profiles.models.career_stage() as of this migration, which must not
+# change with the models
+POSITION_CAREER_STAGES = {
+    'Undergraduate student': 'student',
+    'Masters student': 'student',
+    'Predoc/postbac fellow/resident': 'student',
+    'PhD student': 'student',
+    'Post-doctoral researcher': 'early',
+    'Research scientist/engineer': 'early',
+    'Data scientist/engineer': 'early',
+    'Software engineer': 'early',
+    'Program/product manager': 'early',
+    'Senior research scientist/engineer': 'senior',
+    'Senior data scientist/engineer': 'senior',
+    'Lecturer': 'senior',
+    'Assistant Professor': 'senior',
+    'Associate Professor': 'senior',
+    'Professor': 'senior',
+    'Director/founder/advisor': 'senior',
+}
+SENIOR_KEYWORDS = ('Senior', 'Lecturer', 'Professor', 'Director')
+
+
+def career_stage(position):
+    if position in POSITION_CAREER_STAGES:
+        return POSITION_CAREER_STAGES[position]
+    if any(word.lower() in position.lower() for word in SENIOR_KEYWORDS):
+        return 'senior'
+    return ''
+
+
+def fill_career_stages(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    ProfileCounter = apps.get_model('profiles', 'ProfileCounter')
+
+    # one update per position
+    positions = Profile.objects.order_by().values_list('position', flat=True).distinct()
+    for position in positions:
+        Profile.objects.filter(position=position) \
+                       .update(career_stage=career_stage(position))
+
+    ProfileCounter.objects.bulk_create(
+        ProfileCounter(kind='career_stage', key=key, count=count)
+        for key, count in Profile.objects.filter(is_public=True)
+                                         .order_by()
+                                         .values_list('career_stage')
+                                         .annotate(Count('id')))
+
+
+def clear_career_stage_counters(apps, schema_editor):
+    apps.get_model('profiles', 'ProfileCounter').objects \
+        .filter(kind='career_stage').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0006_outbox_campaigns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='career_stage',
+            field=models.CharField(blank=True, choices=[('student', 'Student'), ('early', 'Early career'), ('senior', 'Senior')], editable=False, max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='profilecounter',
+            name='kind',
+            field=models.CharField(choices=[('country', 'Country code'), ('position', 'Position'), ('method', 'Method code'), ('application', 'Application code'), ('career_stage', 'Career stage')], max_length=20),
+        ),
+        migrations.RunPython(fill_career_stages, clear_career_stage_counters),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['is_public', 'career_stage', 'publish_date', 'id'], name='profile_public_stage_idx'),
+        ),
+    ]
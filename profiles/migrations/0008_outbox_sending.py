@@ -0,0 +1,18 @@
+# Generated by Django 2.2.18 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0007_profile_career_stage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxemail',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.contrib.auth.base_user import BaseUserManager
+from django.contrib.auth.hashers import make_password
 from django.db import models
+from django.db.models.functions import Floor
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
@@ -43,6 +45,39 @@ POSITION_CHOICES = (
     (DIR, 'Director/founder/advisor'),
 )
 
+# career stage of each position, stored with the profiles so that the
+# directory and the statistics filter and group them by equality
+STUDENT = 'student'
+EARLY_CAREER = 'early'
+SENIOR = 'senior'
+
+CAREER_STAGE_CHOICES = (
+    (STUDENT, 'Student'),
+    (EARLY_CAREER, 'Early career'),
+    (SENIOR, 'Senior'),
+)
+
+POSITION_CAREER_STAGES = {
+    US: STUDENT, MS: STUDENT, PD: STUDENT, PHD: STUDENT,
+    PDR: EARLY_CAREER, JRE: EARLY_CAREER, JDS: EARLY_CAREER,
+    SWE: EARLY_CAREER, PM: EARLY_CAREER,
+    SRE: SENIOR, RDS: SENIOR, LEC: SENIOR, ATP: SENIOR, ACP: SENIOR,
+    PRF: SENIOR, DIR: SENIOR,
+}
+
+# words of the senior positions, for the positions saved before the
+# current choices
+SENIOR_KEYWORDS = ('Senior', 'Lecturer', 'Professor', 'Director')
+
+
+def career_stage(position):
+    if position in POSITION_CAREER_STAGES:
+        return POSITION_CAREER_STAGES[position]
+    if any(word.lower() in position.lower() for word in SENIOR_KEYWORDS):
+        return SENIOR
+    return ''
+
+
 MONTHS_CHOICES = (
     ('01', 'January'),
     ('02', 'February'),
@@ -96,6 +131,10 @@ class Country(models.Model):
     class Meta:
         verbose_name_plural = 'countries'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['is_under_represented'],
+                         name='country_ur_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -108,11 +147,27 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault('is_active', True)
         
         email = self.normalize_email(email)
-        user = self.model(email=email, password=password, **extra_fields)
+        user = self.model(email=email, **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
         return user
 
+    def create_users(self, accounts, password=None, batch_size=None, hashed=False):
+        """
+        Create the users of a list of field dicts in bulk, all with the same
+        password, hashed only once, or already hashed if ``hashed``. Meant
+        for generated accounts such as fixtures: users sharing a password
+        also share its salt.
+        """
+        if not hashed:
+            password = make_password(password)
+        users = []
+        for fields in accounts:
+            fields = dict(fields, email=self.normalize_email(fields['email']))
+            fields.setdefault('is_active', True)
+            users += [self.model(password=password, **fields)]
+        return self.bulk_create(users, batch_size=batch_size)
+
     def create_superuser(self, email, password, **extra_fields):
         super_user = self.create_user(email, password, **extra_fields)
         super_user.is_superuser = True
@@ -147,6 +202,84 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.name.split(' ', 1)[0]
 
 
+class ResearchMethod(models.Model):
+    """
+    One of METHODS_CHOICES, linked to the profiles that selected it.
+    """
+    code = models.CharField(max_length=3, primary_key=True,
+                            choices=METHODS_CHOICES)
+
+    def __str__(self):
+        return self.get_code_display()
+
+
+class ResearchApplication(models.Model):
+    """
+    One of APPLICATIONS_CHOICES, linked to the profiles that selected it.
+    """
+    code = models.CharField(max_length=3, primary_key=True,
+                            choices=APPLICATIONS_CHOICES)
+
+    def __str__(self):
+        return self.get_code_display()
+
+
+class ProfileQuerySet(models.QuerySet):
+    def directory(self, s=None, under_represented=False, senior=False, facets=None):
+        """
+        Return the public profiles matching the filters of the directory:
+        every word of the search string s, a country under-represented in
+        machine learning, a senior position, and for each of the facets
+        (see profiles.facets) one of the given values.
+        """
+        # the search index and the facets are defined from the models
+        from .facets import facet_filter
+        from .search import search_filter
+
+        queryset = self.filter(is_public=True)
+        if s is not None:
+            queryset = queryset.filter(search_filter(s))
+        if under_represented:
+            queryset = queryset.filter(country__is_under_represented=True)
+        if senior:
+            queryset = queryset.filter(career_stage=SENIOR)
+        for name, values in (facets or {}).items():
+            queryset = queryset.filter(facet_filter(name, values))
+        return queryset
+
+    def for_list(self):
+        """
+        Load the profiles with their country, and only the columns shown in
+        the directory list.
+        """
+        return self.select_related('country') \
+                   .only('first_name', 'last_name', 'position', 'institution',
+                         'methods', 'applications', 'keywords', 'publish_date',
+                         'country__name')
+
+    def for_detail(self):
+        return self.select_related('country') \
+                   .defer('user', 'is_public', 'publish_date',
+                          'country__code', 'country__is_under_represented')
+
+    def for_api(self):
+        return self.select_related('country').defer('user', 'is_public', 'contact_email')
+
+    def for_sitemap(self):
+        return self.filter(is_public=True).only('last_updated').order_by('pk')
+
+    def sitemap_sections(self, section_size):
+        """
+        Number and last modification of each range of section_size ids
+        having public profiles.
+        """
+        return (self.filter(is_public=True)
+                .annotate(section=Floor((models.F('pk') - 1) / section_size))
+                .values('section')
+                .annotate(lastmod=models.Max('last_updated'))
+                .order_by('section'))
+
+
 class Profile(models.Model):
 
     @classmethod
@@ -176,17 +309,56 @@ class Profile(models.Model):
     grad_month = models.CharField(max_length=2, choices=MONTHS_CHOICES,
                                   blank=True)
     grad_year = models.CharField(max_length=4, blank=True)
+    # derived from position on save
+    career_stage = models.CharField(max_length=10, choices=CAREER_STAGE_CHOICES,
+                                    blank=True, editable=False)
     methods = MultiSelectField(choices=METHODS_CHOICES, blank=True)
     applications = MultiSelectField(choices=APPLICATIONS_CHOICES, blank=True)
+    # indexed copies of methods and applications, synced on save
+    research_methods = models.ManyToManyField(ResearchMethod, blank=True,
+                                              editable=False,
+                                              related_name='profiles')
+    research_applications = models.ManyToManyField(ResearchApplication,
+                                                   blank=True, editable=False,
+                                                   related_name='profiles')
     keywords = models.CharField(max_length=250, blank=True)
     publish_date = models.DateTimeField(default=timezone.now)
     last_updated = models.DateTimeField(auto_now=True)
 
+    objects = ProfileQuerySet.as_manager()
+
     class Meta:
         ordering = ['last_name', 'institution', 'last_updated']
+        # partial indexes (is_public=True) would be smaller, but MySQL
+        # ignores them
+        indexes = [
+            # directory list, in keyset pagination order
+            models.Index(fields=['is_public', 'publish_date', 'id'],
+                         name='profile_public_recent_idx'),
+            # public profiles by last update, as in the sitemap
+            models.Index(fields=['is_public', 'last_updated'],
+                         name='profile_public_updated_idx'),
+            models.Index(fields=['country', 'is_public'],
+                         name='profile_country_public_idx'),
+            models.Index(fields=['position', 'is_public'],
+                         name='profile_position_public_idx'),
+            # directory list filtered by career stage
+            models.Index(fields=['is_public', 'career_stage', 'publish_date', 'id'],
+                         name='profile_public_stage_idx'),
+            # default ordering
+            models.Index(fields=['last_name', 'institution', 'last_updated'],
+                         name='profile_ordering_idx'),
+        ]
 
     def __str__(self):
-        return f'{self.name}, {self.institution}'
+        return f'{self.first_name} {self.last_name}, {self.institution}'
+
+    def save(self, *args, **kwargs):
+        self.career_stage = career_stage(self.position)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'position' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'career_stage'}
+        super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse('profiles:detail', kwargs={'pk': self.id})
@@ -199,5 +371,125 @@ class Profile(models.Model):
         return [dict(APPLICATIONS_CHOICES).get(item, item)
                 for item in self.applications]
 
+    def selected_codes(self, field_name):
+        """
+        Return the codes selected in the methods or applications field, also
+        when it still holds the comma separated string it was created from.
+        """
+        field = self._meta.get_field(field_name)
+        valid = dict(field.choices)
+        return [code for code in field.to_python(getattr(self, field_name))
+                if code in valid]
+
+    def sync_research_fields(self):
+        self.research_methods.set(self.selected_codes('methods'))
+        self.research_applications.set(self.selected_codes('applications'))
+
     def grad_month_labels(self):
-        return dict(MONTHS_CHOICES).get(self.grad_month)
\ No newline at end of file
+        return dict(MONTHS_CHOICES).get(self.grad_month)
+
+    def years_since_graduation(self, today=None):
+        """
+        Return the number of full years since the PhD graduation, counted
+        from the middle of the year when the month is unknown, or None.
+        """
+        if len(self.grad_year) != 4 or not self.grad_year.isdigit():
+            return None
+        today = today or timezone.now().date()
+        month = int(self.grad_month) if self.grad_month.isdigit() else 6
+        years = today.year - int(self.grad_year) - (today.month < month)
+        return max(years, 0)
+
+
+class SearchToken(models.Model):
+    """
+    Entry of the directory search index: one normalized word found in the
+    searchable fields of a profile (see profiles.search).
+    """
+    token = models.CharField(max_length=50, db_index=True)
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE,
+                                related_name='search_tokens')
+
+    class Meta:
+        unique_together = ('token', 'profile')
+
+    def __str__(self):
+        return self.token
+
+
+class ProfileCounter(models.Model):
+    """
+    Number of public profiles sharing a value, kept up to date on every
+    profile change (see profiles.stats).
+    """
+    COUNTRY = 'country'
+    POSITION = 'position'
+    METHOD = 'method'
+    APPLICATION = 'application'
+    CAREER_STAGE = 'career_stage'
+
+    KIND_CHOICES = (
+        (COUNTRY, 'Country code'),
+        (POSITION, 'Position'),
+        (METHOD, 'Method code'),
+        (APPLICATION, 'Application code'),
+        (CAREER_STAGE, 'Career stage'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    key = models.CharField(max_length=50, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('kind', 'key')
+
+    def __str__(self):
+        return f'{self.kind} {self.key}: {self.count}'
+
+
+class OutboxEmail(models.Model):
+    """
+    Email waiting to be sent by the send_outbox command, so that requests
+    never wait for the mail server (see profiles.outbox).
+    """
+    PENDING = 'pending'
+    # claimed by a worker until next_attempt_at
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    subject = models.CharField(max_length=998)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    # one address per line
+    to = models.TextField()
+
+    # campaign emails are sent once per user, account emails have no campaign
+    campaign = models.CharField(max_length=50, null=True, blank=True)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE,
+                             related_name='outbox_emails')
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('campaign', 'user')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'],
+                         name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} ({self.status})'
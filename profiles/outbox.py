@@ -0,0 +1,192 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+# time a worker has to send the emails it claimed, on top of the rate
+# limit, before they are due again
+CLAIM_LEASE = timedelta(minutes=10)
+
+
+def _row(message, **fields):
+    html_body = ''
+    for content, mimetype in getattr(message, 'alternatives', []):
+        if mimetype == 'text/html':
+            html_body = content
+
+    return OutboxEmail(
+        subject=message.subject,
+        body=message.body,
+        html_body=html_body,
+        from_email=message.from_email,
+        to='\n'.join(message.to),
+        **fields
+    )
+
+
+def enqueue(message, user=None):
+    """
+    Store an EmailMultiAlternatives in the outbox instead of sending it.
+    """
+    email = _row(message, user=user)
+    email.save()
+    return email
+
+
+def enqueue_campaign(campaign, users, build_message, batch_size=500):
+    """
+    Store the message returned by ``build_message(user)`` for each of the
+    ``users`` who has not been queued an email of the campaign yet, so that
+    an interrupted campaign can be resumed. Returns the number queued.
+    """
+    users = users.exclude(outbox_emails__campaign=campaign).order_by('pk')
+    queued = 0
+    batch = []
+    for user in users.iterator():
+        batch += [_row(build_message(user), campaign=campaign, user=user)]
+        if len(batch) >= batch_size:
+            queued += _insert_campaign_emails(campaign, batch)
+            batch = []
+    return queued + _insert_campaign_emails(campaign, batch)
+
+
+def _insert_campaign_emails(campaign, batch):
+    # a concurrent run may have queued some of them already, which
+    # ignore_conflicts skips without telling the rows inserted
+    if not batch:
+        return 0
+    emails = OutboxEmail.objects.filter(campaign=campaign,
+                                        user__in=[email.user_id for email in batch])
+    before = emails.count()
+    OutboxEmail.objects.bulk_create(batch, ignore_conflicts=True)
+    return emails.count() - before
+
+
+def build_message(email, connection=None):
+    message = EmailMultiAlternatives(email.subject, email.body, email.from_email,
+                                     email.to.splitlines(), connection=connection)
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def retry_delay(attempts, backoff):
+    """
+    Delay before the next attempt at an email which failed ``attempts``
+    times, doubling from ``backoff`` seconds.
+    """
+    return timedelta(seconds=backoff * 2 ** (attempts - 1))
+
+
+def _due_emails(limit, campaign):
+    # emails still being sent once their claim expired were claimed by a
+    # worker which stopped before recording the outcome
+    # without SKIP LOCKED, concurrent workers wait for each other's claim
+    features = connections[router.db_for_write(OutboxEmail)].features
+    due = (OutboxEmail.objects
+           .select_for_update(skip_locked=features.has_select_for_update_skip_locked)
+           .filter(status__in=(OutboxEmail.PENDING, OutboxEmail.SENDING),
+                   next_attempt_at__lte=timezone.now())
+           .order_by('next_attempt_at', 'pk'))
+    if campaign is not None:
+        return list(due.filter(campaign=campaign)[:limit])
+
+    # account emails first, so that a large campaign does not delay them
+    emails = list(due.filter(campaign__isnull=True)[:limit])
+    if len(emails) < limit:
+        emails += due.filter(campaign__isnull=False)[:limit - len(emails)]
+    return emails
+
+
+def claim(limit, campaign=None, lease=CLAIM_LEASE):
+    """
+    Mark up to ``limit`` due emails as being sent until ``lease`` from now,
+    so that no other worker sends them meanwhile, and return them. The rows
+    are only locked for the duration of the claim.
+    """
+    with transaction.atomic():
+        emails = _due_emails(limit, campaign)
+        until = timezone.now() + lease
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]) \
+                           .update(status=OutboxEmail.SENDING, next_attempt_at=until)
+    return emails
+
+
+def release(emails):
+    """
+    Make claimed emails due again right away, when they could not be sent.
+    """
+    OutboxEmail.objects.filter(pk__in=[email.pk for email in emails],
+                               status=OutboxEmail.SENDING) \
+                       .update(status=OutboxEmail.PENDING, next_attempt_at=timezone.now())
+
+
+def drain(limit=100, max_attempts=5, backoff=60, connection=None,
+          campaign=None, rate=None):
+    """
+    Send up to ``limit`` due emails of the outbox, or of a ``campaign``,
+    through a single connection and at most ``rate`` emails per second
+    (EMAIL_RATE_LIMIT by default, 0 for no limit). Returns the number of
+    emails sent and failed.
+
+    An email failing is retried later with an exponential backoff, and
+    marked as failed for good after ``max_attempts``. Emails are claimed
+    before being sent, so that several workers can drain the outbox, and
+    sent outside of any transaction, the outcome of each being saved right
+    after it. Should a worker stop while sending, only the email being
+    sent may be sent again, once its claim expires.
+    """
+    connection = connection or get_connection()
+    rate = settings.EMAIL_RATE_LIMIT if rate is None else rate
+    interval = 1 / rate if rate else 0
+    sent, failed = 0, 0
+    emails = claim(limit, campaign, CLAIM_LEASE + timedelta(seconds=limit * interval))
+    if not emails:
+        return sent, failed
+
+    try:
+        connection.open()
+    except Exception:
+        release(emails)
+        raise
+
+    # the emails not handed to the backend yet
+    remaining = list(emails)
+    try:
+        next_send = time.monotonic()
+        while remaining:
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_send = time.monotonic() + interval
+
+            email = remaining.pop(0)
+            email.attempts += 1
+            try:
+                connection.send_messages([build_message(email, connection)])
+            except Exception as e:
+                email.last_error = repr(e)
+                if email.attempts >= max_attempts:
+                    email.status = OutboxEmail.FAILED
+                else:
+                    email.status = OutboxEmail.PENDING
+                    email.next_attempt_at = timezone.now() + \
+                        retry_delay(email.attempts, backoff)
+                failed += 1
+            else:
+                email.status = OutboxEmail.SENT
+                email.sent_at = timezone.now()
+                sent += 1
+            email.save(update_fields=['attempts', 'status', 'last_error',
+                                      'next_attempt_at', 'sent_at'])
+    finally:
+        connection.close()
+        # an email interrupted while or after being sent keeps its claim
+        # until it expires
+        release(remaining)
+    return sent, failed
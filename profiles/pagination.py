@@ -0,0 +1,176 @@
+from bisect import bisect_right
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(obj, field):
+    value = getattr(obj, field).isoformat()
+    return urlsafe_base64_encode(force_bytes(f'{value}|{obj.pk}'))
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk = urlsafe_base64_decode(cursor).decode().rsplit('|', 1)
+        value, pk = parse_datetime(value), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+    if value is None:
+        raise InvalidCursor(cursor)
+    return value, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset from the most recent object, by (field, pk) in
+    descending order.
+
+    Unlike Django's Paginator, pages are addressed by an opaque cursor
+    pointing at the last object of the previous page, so fetching a page
+    costs the same whatever its depth and requires no count.
+    """
+    def __init__(self, queryset, per_page, field='publish_date'):
+        self.queryset = queryset.order_by(f'-{field}', '-pk')
+        self.per_page = per_page
+        self.field = field
+
+    @property
+    def count(self):
+        return self.queryset.count()
+
+    def page_queryset(self, cursor=None):
+        """
+        Return the query of a page, with one extra object telling whether
+        there is a next page.
+        """
+        queryset = self.queryset
+        if cursor:
+            value, pk = decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__lt': value}) |
+                Q(**{self.field: value, 'pk__lt': pk}))
+        return queryset[:self.per_page + 1]
+
+    def page(self, cursor=None):
+        object_list = list(self.page_queryset(cursor))
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = encode_cursor(object_list[-1], self.field)
+
+        return KeysetPage(object_list, next_cursor)
+
+
+def encode_rank_cursor(score, pk):
+    return urlsafe_base64_encode(force_bytes(f'{score!r}|{pk}'))
+
+
+def decode_rank_cursor(cursor):
+    try:
+        score, pk = urlsafe_base64_decode(cursor).decode().rsplit('|', 1)
+        return float(score), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+class RankedPaginator:
+    """
+    Paginate search results ranked by relevance, (pk, score) pairs by
+    decreasing score then pk, loading only the objects of the page from
+    the queryset.
+
+    Like KeysetPaginator, a cursor points at the last result of the
+    previous page, so that results ranked before it meanwhile do not shift
+    the following pages.
+    """
+    def __init__(self, results, queryset, per_page):
+        self.results = results
+        self.queryset = queryset
+        self.per_page = per_page
+
+    @property
+    def count(self):
+        return len(self.results)
+
+    def page(self, cursor=None):
+        start = 0
+        if cursor:
+            score, pk = decode_rank_cursor(cursor)
+            keys = [(-s, -p) for p, s in self.results]
+            start = bisect_right(keys, (-score, -pk))
+
+        results = self.results[start:start + self.per_page]
+        objects = self.queryset.in_bulk([pk for pk, _ in results])
+        object_list = [objects[pk] for pk, _ in results if pk in objects]
+        next_cursor = None
+        if start + self.per_page < len(self.results):
+            next_cursor = encode_rank_cursor(*reversed(results[-1]))
+
+        return KeysetPage(object_list, next_cursor)
+
+
+class KeysetPagination(BasePagination):
+    """
+    REST framework pagination by KeysetPaginator, from the cursor query
+    parameter. Like the directory, only the first page has a count.
+    """
+    page_size = 20
+    max_page_size = 100
+    field = 'publish_date'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = request.query_params.get('cursor')
+        paginator = KeysetPaginator(queryset, self.get_page_size(request), self.field)
+        try:
+            self.page = paginator.page(cursor)
+        except InvalidCursor:
+            raise NotFound('Invalid cursor.')
+        self.count = None if cursor else paginator.count
+        return self.page.object_list
+
+    def get_next_link(self):
+        if not self.page.has_next():
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   'cursor', self.page.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
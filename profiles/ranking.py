@@ -0,0 +1,244 @@
+from bisect import bisect_left, insort
+from collections import Counter
+from math import log
+
+from .indexes import ProfileIndex
+from .models import APPLICATIONS_CHOICES, METHODS_CHOICES
+from .search import expand_term, tokenize
+
+# weight of a word found in each field, the fields being read from the
+# profile fields of the same position in RankingIndex.fields
+FIELD_WEIGHTS = (
+    ('name', 4.0),
+    ('keywords', 2.0),
+    ('methods', 2.0),
+    ('applications', 2.0),
+    ('position', 1.5),
+    ('institution', 1.5),
+    ('country', 1.0),
+)
+
+# BM25 term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+# weight of the words matching a search term by prefix, and by edit distance
+PREFIX_FACTOR = 0.7
+FUZZY_FACTORS = {1: 0.5, 2: 0.3}
+# minimum length of the terms matched with one edit, and with two edits
+FUZZY_MIN_LENGTHS = {1: 4, 2: 8}
+
+_methods = dict(METHODS_CHOICES)
+_applications = dict(APPLICATIONS_CHOICES)
+
+# prefixes of the words standing for a method or application code, which
+# search terms can not start with
+METHOD_PREFIX = '#method:'
+APPLICATION_PREFIX = '#application:'
+
+
+def _choice_words(codes, labels, prefix):
+    # the words of the labels, and a word per code matched by the terms
+    # found anywhere in its label, as in the database search
+    codes = [code for code in codes or () if code in labels]
+    return tokenize(' '.join(labels[code] for code in codes)) \
+        + [f'{prefix}{code}' for code in codes]
+
+
+def profile_fields(first_name, last_name, keywords, methods, applications,
+                   position, institution, country):
+    """
+    Return the words of each field of FIELD_WEIGHTS.
+    """
+    return (
+        tokenize(f'{first_name} {last_name}'),
+        tokenize(keywords),
+        _choice_words(methods, _methods, METHOD_PREFIX),
+        _choice_words(applications, _applications, APPLICATION_PREFIX),
+        tokenize(position),
+        tokenize(institution),
+        tokenize(country),
+    )
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """
+    Return the optimal string alignment distance between two words (edits
+    being insertions, deletions, substitutions and transpositions of
+    adjacent letters), or limit + 1 if it is above limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+class RankingIndex(ProfileIndex):
+    """
+    Inverted index of the words of the public profiles, with the BM25F
+    weight of each word in each profile, combining the frequency of the
+    word in each field, the field weight and the field length.
+
+    The average field lengths are those of the last rebuild, so that the
+    weights of the profiles not updated since remain valid.
+    """
+    fields = ('pk', 'is_public', 'first_name', 'last_name', 'keywords', 'methods',
+              'applications', 'position', 'institution', 'country__name')
+
+    def __init__(self):
+        super().__init__()
+        self.postings = {}
+        self.profile_words = {}
+        self.words = []
+        self.trigrams = {}
+        self.average_lengths = [1] * len(FIELD_WEIGHTS)
+
+    def build(self, rows):
+        rows = [(row[0], profile_fields(*row[2:])) for row in rows if row[1]]
+        for i in range(len(FIELD_WEIGHTS)):
+            lengths = [len(fields[i]) for _, fields in rows]
+            self.average_lengths[i] = max(sum(lengths) / len(lengths), 1) if rows else 1
+        for pk, fields in rows:
+            self.add(pk, fields, sort=False)
+        self.words.sort()
+
+    def update(self, rows):
+        for row in rows:
+            self.remove(row[0])
+            if row[1]:
+                self.add(row[0], profile_fields(*row[2:]))
+
+    def add(self, pk, fields, sort=True):
+        frequencies = Counter()
+        for (_, weight), words, average in zip(FIELD_WEIGHTS, fields, self.average_lengths):
+            norm = weight / (1 - B + B * len(words) / average)
+            for word in words:
+                frequencies[word] += norm
+
+        for word, frequency in frequencies.items():
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = {}
+                if not word.startswith('#'):
+                    if sort:
+                        insort(self.words, word)
+                    else:
+                        self.words.append(word)
+                    for trigram in trigrams(word):
+                        self.trigrams.setdefault(trigram, set()).add(word)
+            postings[pk] = frequency * (K1 + 1) / (frequency + K1)
+        self.profile_words[pk] = list(frequencies)
+
+    def remove(self, pk):
+        for word in self.profile_words.pop(pk, ()):
+            postings = self.postings[word]
+            del postings[pk]
+            if not postings:
+                del self.postings[word]
+                if not word.startswith('#'):
+                    del self.words[bisect_left(self.words, word)]
+                    for trigram in trigrams(word):
+                        self.trigrams[trigram].discard(word)
+
+    def expand(self, term):
+        """
+        Return the indexed words matching a search term, with the factor of
+        their weight: the term itself, the methods and applications whose
+        label contains it, the words starting with it and the words a few
+        edits away.
+        """
+        matches = {}
+        if term in self.postings:
+            matches[term] = 1
+        method_codes, application_codes = expand_term(term)
+        for word in [METHOD_PREFIX + code for code in method_codes] + \
+                [APPLICATION_PREFIX + code for code in application_codes]:
+            if word in self.postings:
+                matches[word] = 1
+
+        # every word starting with the term, as in search_filter
+        start = bisect_left(self.words, term)
+        end = bisect_left(self.words, term[:-1] + chr(ord(term[-1]) + 1))
+        for word in self.words[start:end]:
+            if word != term:
+                matches[word] = PREFIX_FACTOR
+
+        limit = max((d for d, length in FUZZY_MIN_LENGTHS.items() if len(term) >= length),
+                    default=0)
+        if limit:
+            term_trigrams = trigrams(term)
+            shared = Counter()
+            for trigram in term_trigrams:
+                shared.update(self.trigrams.get(trigram, ()))
+            # each edit changes at most 3 trigrams
+            minimum = max(len(term_trigrams) - 3 * limit, 1)
+            for word, count in shared.items():
+                if count >= minimum and word not in matches:
+                    distance = edit_distance(term, word, limit)
+                    if distance <= limit:
+                        matches[word] = FUZZY_FACTORS[distance]
+        return matches
+
+    def search(self, s):
+        """
+        Return the (id, score) of the public profiles matching every word
+        of a search string, by decreasing score, or None if it has no word.
+        """
+        terms = list(dict.fromkeys(tokenize(s)))
+        if not terms:
+            return None
+
+        count = len(self.profile_words)
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for word, factor in self.expand(term).items():
+                postings = self.postings[word]
+                # BM25 inverse document frequency
+                weight = factor * log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                if not term_scores:
+                    term_scores = {pk: weight * w for pk, w in postings.items()}
+                    continue
+                for pk, w in postings.items():
+                    score = weight * w
+                    if score > term_scores.get(pk, 0):
+                        term_scores[pk] = score
+
+            if scores is None:
+                scores = term_scores
+            else:
+                if len(term_scores) < len(scores):
+                    scores, term_scores = term_scores, scores
+                scores = {pk: score + term_scores[pk]
+                          for pk, score in scores.items() if pk in term_scores}
+            if not scores:
+                return []
+
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+def rank(s):
+    """
+    Return the (id, score) of the public profiles matching a search string
+    by relevance, or None if it has no word.
+
+    The profiles matched are those of profiles.search.search_filter, used
+    by the API and the export, plus the profiles matching a term only with
+    typos, which the database index can not find.
+    """
+    with RankingIndex.current() as index:
+        return index.search(s)
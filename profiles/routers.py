@@ -0,0 +1,51 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = 'replica'
+
+_state = threading.local()
+
+
+def has_replica():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def replica_reads():
+    """
+    Send the reads of the current thread to the replica, if there is one,
+    for the duration of the block.
+    """
+    previous = getattr(_state, 'replica', False)
+    _state.replica = has_replica()
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+class ReplicaRouter:
+    """
+    Read from the replica database within replica_reads(), which the public
+    views use (see profiles.middleware.ReplicaMiddleware), and from the
+    default database otherwise. Writes and migrations always go to the
+    default database, the replica following it.
+    """
+    def db_for_read(self, model, **hints):
+        return REPLICA_ALIAS if getattr(_state, 'replica', False) else None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both databases hold the same rows
+        databases = {DEFAULT_DB_ALIAS, REPLICA_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA_ALIAS
@@ -0,0 +1,224 @@
+import re
+from functools import lru_cache
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import cache
+from .models import (
+    APPLICATIONS_CHOICES,
+    METHODS_CHOICES,
+    Country,
+    Profile,
+    ResearchApplication,
+    ResearchMethod,
+    SearchToken,
+)
+
+MethodLink = Profile.research_methods.through
+ApplicationLink = Profile.research_applications.through
+
+TOKEN_MAX_LENGTH = SearchToken._meta.get_field('token').max_length
+
+_word_re = re.compile(r'\w+')
+
+# version of the countries, their list ordered by name and a matcher of
+# their positions in the list
+_countries = (None, [], None)
+
+
+class ChoiceMatcher:
+    """
+    Find the choices whose label contains a search term, from a table of
+    every substring of the lowercase labels built once.
+    """
+    def __init__(self, choices):
+        matches = {}
+        for code, label in choices:
+            label = label.lower()
+            for start in range(len(label)):
+                for end in range(start + 1, len(label) + 1):
+                    matches.setdefault(label[start:end], []).append(code)
+        self.matches = {sub: tuple(dict.fromkeys(codes))
+                        for sub, codes in matches.items()}
+
+    def match(self, term):
+        return self.matches.get(term.lower(), ())
+
+
+methods_matcher = ChoiceMatcher(METHODS_CHOICES)
+applications_matcher = ChoiceMatcher(APPLICATIONS_CHOICES)
+
+
+@lru_cache(maxsize=4096)
+def expand_term(term):
+    """
+    Return the codes of the methods and of the applications whose label
+    contains a search term.
+    """
+    return methods_matcher.match(term), applications_matcher.match(term)
+
+
+def tokenize(text):
+    """
+    Split a text into lowercase words, truncated to fit in the index.
+    """
+    if not text:
+        return []
+    return [w[:TOKEN_MAX_LENGTH] for w in _word_re.findall(text.lower())]
+
+
+def profile_tokens(profile):
+    """
+    Return the set of words under which a profile can be found: names,
+    institution, position, country and keywords. Methods and applications
+    are searched through the research_* relations.
+    """
+    fields = [
+        profile.first_name,
+        profile.last_name,
+        profile.institution,
+        profile.position,
+        profile.country.name,
+        profile.keywords,
+    ]
+
+    tokens = set()
+    for field in fields:
+        tokens.update(tokenize(field))
+    return tokens
+
+
+def index_profile(profile):
+    """
+    Bring the search index of a single profile up to date.
+    """
+    tokens = profile_tokens(profile)
+    with transaction.atomic():
+        indexed = set(SearchToken.objects.filter(profile=profile)
+                                         .values_list('token', flat=True))
+        stale = indexed - tokens
+        if stale:
+            SearchToken.objects.filter(profile=profile, token__in=stale).delete()
+        SearchToken.objects.bulk_create(
+            SearchToken(profile=profile, token=t) for t in tokens - indexed)
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Re-index every profile from scratch. Returns the number of profiles indexed.
+    """
+    count = 0
+    with transaction.atomic():
+        SearchToken.objects.all().delete()
+        batch = []
+        profiles = Profile.objects.select_related('country').order_by('pk')
+        for profile in profiles.iterator():
+            batch += [SearchToken(profile=profile, token=t)
+                      for t in profile_tokens(profile)]
+            if len(batch) >= batch_size:
+                SearchToken.objects.bulk_create(batch)
+                batch = []
+            count += 1
+        SearchToken.objects.bulk_create(batch)
+    return count
+
+
+def create_research_choices():
+    """
+    Create the missing ResearchMethod and ResearchApplication rows, which
+    are data rather than schema and do not survive a flush.
+    """
+    ResearchMethod.objects.bulk_create(
+        [ResearchMethod(code=code) for code, _ in METHODS_CHOICES],
+        ignore_conflicts=True)
+    ResearchApplication.objects.bulk_create(
+        [ResearchApplication(code=code) for code, _ in APPLICATIONS_CHOICES],
+        ignore_conflicts=True)
+
+
+def rebuild_research_fields(batch_size=1000):
+    """
+    Re-create the research_methods and research_applications relations of
+    every profile from its methods and applications fields.
+    """
+    with transaction.atomic():
+        create_research_choices()
+        MethodLink.objects.all().delete()
+        ApplicationLink.objects.all().delete()
+        method_links, application_links = [], []
+        profiles = Profile.objects.only('methods', 'applications').order_by('pk')
+        for profile in profiles.iterator():
+            method_links += [
+                MethodLink(profile_id=profile.pk, researchmethod_id=code)
+                for code in profile.selected_codes('methods')]
+            application_links += [
+                ApplicationLink(profile_id=profile.pk, researchapplication_id=code)
+                for code in profile.selected_codes('applications')]
+            if len(method_links) + len(application_links) >= batch_size:
+                MethodLink.objects.bulk_create(method_links)
+                ApplicationLink.objects.bulk_create(application_links)
+                method_links, application_links = [], []
+        MethodLink.objects.bulk_create(method_links)
+        ApplicationLink.objects.bulk_create(application_links)
+
+
+def _prefix_filter(term):
+    # a range rather than startswith, which becomes a LIKE that some
+    # databases can not resolve with the index
+    upper = term[:-1] + chr(ord(term[-1]) + 1)
+    return Q(token__gte=term, token__lt=upper)
+
+
+def search_filter(s):
+    """
+    Return a filter matching the profiles that have, for every word of the
+    search string, an indexed word starting with it or a method or
+    application whose label contains it.
+
+    The directory list (profiles.ranking.rank) and the snapshot search
+    (snapshot.js) match the same profiles, the list also matching the
+    longer words with a few typos.
+    """
+    q = Q()
+    for term in sorted(set(tokenize(s))):
+        q_term = Q(pk__in=SearchToken.objects.filter(_prefix_filter(term))
+                                             .values('profile_id'))
+
+        method_codes, application_codes = expand_term(term)
+        if method_codes:
+            q_term |= Q(pk__in=MethodLink.objects
+                        .filter(researchmethod__in=method_codes)
+                        .values('profile_id'))
+        if application_codes:
+            q_term |= Q(pk__in=ApplicationLink.objects
+                        .filter(researchapplication__in=application_codes)
+                        .values('profile_id'))
+
+        q &= q_term
+    return q
+
+
+def search_countries(q):
+    """
+    Return the countries, ordered by name, whose name contains every word
+    of ``q``.
+
+    Each process keeps the countries and a matcher of their names in
+    memory until a country is saved, which bumps the countries version.
+    """
+    global _countries
+    version = cache.countries_version()
+    if _countries[0] != version:
+        countries = list(Country.objects.order_by('name'))
+        matcher = ChoiceMatcher((i, country.name) for i, country in enumerate(countries))
+        _countries = (version, countries, matcher)
+
+    _, countries, matcher = _countries
+    positions = None
+    for word in q.split():
+        matches = set(matcher.match(word))
+        positions = matches if positions is None else positions & matches
+    if positions is None:
+        return countries
+    return [countries[i] for i in sorted(positions)]
@@ -1,23 +1,63 @@
 
 from rest_framework import serializers
 
-from .models import Profile, Country
+from .models import (APPLICATIONS_CHOICES, CAREER_STAGE_CHOICES, METHODS_CHOICES,
+                     Profile, Country)
 
 
 class CountrySerializer(serializers.ModelSerializer):
-    profiles_count = serializers.SerializerMethodField()
+    profiles_count = serializers.IntegerField()
 
     class Meta:
         model = Country
         fields = ('id', 'name', 'profiles_count')
 
-    def get_profiles_count(self, obj):
-        return obj.profile_set.filter(is_public=True).count()
-
 class ProfileSerializer(serializers.ModelSerializer):
+    """
+    Public fields of a profile, or only the given ``fields``. The contact
+    email is left out, not to hand the addresses of the whole directory to
+    every client.
+    """
+    country = serializers.CharField(source='country.name')
+    country_code = serializers.CharField(source='country.code')
+    methods = serializers.ListField(source='methods_labels', child=serializers.CharField())
+    applications = serializers.ListField(source='applications_labels', child=serializers.CharField())
+    years_since_graduation = serializers.IntegerField(read_only=True)
+    url = serializers.SerializerMethodField()
+
     class Meta:
         model = Profile
-        fields = ('id', 'last_name')
+        fields = ('id', 'first_name', 'last_name', 'position', 'career_stage',
+                  'institution', 'country', 'country_code', 'grad_month',
+                  'grad_year', 'years_since_graduation',
+                  'methods', 'applications', 'keywords', 'webpage',
+                  'url', 'publish_date', 'last_updated')
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def get_url(self, obj):
+        url = obj.get_absolute_url()
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+def requested_fields(params):
+    """
+    Return the ProfileSerializer fields listed in the fields query
+    parameter, or None if there is none.
+    """
+    if not params.get('fields'):
+        return None
+    fields = [f.strip() for f in params['fields'].split(',') if f.strip()]
+    unknown = set(fields) - set(ProfileSerializer.Meta.fields)
+    if unknown:
+        raise serializers.ValidationError(
+            {'fields': f'Unknown fields: {", ".join(sorted(unknown))}.'})
+    return fields
 
 
 class PositionsCountSerializer(serializers.ModelSerializer):
@@ -26,3 +66,26 @@ class PositionsCountSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ('position', 'profiles_count')
+
+
+class ChoicesCountSerializer(serializers.Serializer):
+    choices = ()
+
+    code = serializers.CharField()
+    label = serializers.SerializerMethodField()
+    profiles_count = serializers.IntegerField()
+
+    def get_label(self, obj):
+        return dict(self.choices).get(obj['code'], obj['code'])
+
+
+class MethodsCountSerializer(ChoicesCountSerializer):
+    choices = METHODS_CHOICES
+
+
+class ApplicationsCountSerializer(ChoicesCountSerializer):
+    choices = APPLICATIONS_CHOICES
+
+
+class CareerStagesCountSerializer(ChoicesCountSerializer):
+    choices = CAREER_STAGE_CHOICES
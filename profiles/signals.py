@@ -0,0 +1,82 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache, search, stats
+from .models import Country, Profile
+from .sitemaps import profile_section
+
+
+@receiver(pre_save, sender=Profile)
+@receiver(pre_delete, sender=Profile)
+def remember_profile_counters(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._counted_keys = stats.stored_keys(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+def update_saved_profile(sender, instance, raw=False, **kwargs):
+    # fixtures are loaded raw, run `manage.py rebuild_search_index` and
+    # `manage.py rebuild_stats` after
+    if raw:
+        return
+    instance.sync_research_fields()
+    search.index_profile(instance)
+    new_keys = stats.instance_keys(instance)
+    stats.update_counters(instance._counted_keys, new_keys)
+    invalidate_profile_pages(instance, bool(instance._counted_keys or new_keys))
+
+
+@receiver(post_delete, sender=Profile)
+def uncount_deleted_profile(sender, instance, **kwargs):
+    counted_keys = getattr(instance, '_counted_keys', set())
+    stats.update_counters(counted_keys, set())
+    if counted_keys:
+        # deleted profiles can not be found among the recently saved ones
+        cache.bump_indexes_version()
+    invalidate_profile_pages(instance, bool(counted_keys))
+
+
+def invalidate_profile_pages(profile, is_listed):
+    cache.bump_profile_version(profile.pk)
+    # the directory only lists public profiles
+    if is_listed:
+        cache.bump_directory_version()
+        cache.bump_sitemap_version(f'profiles-{profile_section(profile.pk)}')
+
+
+@receiver(pre_save, sender=Country)
+def remember_country(sender, instance, raw=False, **kwargs):
+    instance._stored = None
+    if raw or instance.pk is None:
+        return
+    instance._stored = Country.objects.filter(pk=instance.pk) \
+                                      .values('name', 'code') \
+                                      .first()
+
+
+@receiver(post_save, sender=Country)
+def update_country_profiles(sender, instance, created=False, raw=False, **kwargs):
+    stored = instance._stored
+    if raw:
+        return
+    if created or stored is None:
+        # no profile is in the country yet, it only appears in searches
+        cache.bump_countries_version()
+        return
+
+    cache.bump_countries_version()
+    cache.bump_directory_version()
+
+    if stored['code'] != instance.code:
+        stats.rename_country(stored['code'], instance.code)
+
+    if stored['name'] != instance.name:
+        for profile in instance.profile_set.select_related('country'):
+            search.index_profile(profile)
+
+
+@receiver(post_delete, sender=Country)
+def invalidate_country_pages(sender, instance, **kwargs):
+    cache.bump_countries_version()
+    cache.bump_directory_version()
@@ -1,8 +1,15 @@
 from django.contrib import sitemaps
+from django.core.paginator import Paginator
+from django.db.models import Max
 from django.urls import reverse
 
+from . import cache
 from .models import Profile
 
+# number of profile ids per section of the sitemap, whose pages are
+# limited to 50000 URLs
+SECTION_SIZE = 10000
+
 
 class HomeSitemap(sitemaps.Sitemap):
     priority = 0.4
@@ -37,12 +44,71 @@ class ListSitemap(sitemaps.Sitemap):
         return reverse(item)
 
 
+def profile_section(pk):
+    return (pk - 1) // SECTION_SIZE
+
+
+def profile_sections():
+    """
+    Return the number and last modification of the sections of the
+    sitemap listing public profiles, in order.
+    """
+    return [(int(s['section']), s['lastmod'])
+            for s in Profile.objects.sitemap_sections(SECTION_SIZE)]
+
+
 class ProfilesSitemap(sitemaps.Sitemap):
+    """
+    Public profiles of one section, the ids from section * SECTION_SIZE + 1
+    to (section + 1) * SECTION_SIZE.
+    """
     changefreq = 'monthly'
     priority = 0.5
+    limit = SECTION_SIZE
+
+    def __init__(self, section):
+        self.section = section
 
     def items(self):
-        return Profile.objects.all()
+        first = self.section * SECTION_SIZE + 1
+        return Profile.objects.for_sitemap() \
+                              .filter(pk__range=(first, first + SECTION_SIZE - 1))
 
     def lastmod(self, obj):
         return obj.last_updated
+
+    @property
+    def paginator(self):
+        # a section without public profiles is not in the index, the
+        # sitemap view answers 404 for its empty page
+        return Paginator(self.items(), self.limit, allow_empty_first_page=False)
+
+
+STATIC_SITEMAPS = {
+    'home': HomeSitemap,
+    'list': ListSitemap,
+    'faq': FaqSitemap,
+}
+
+
+def get_sitemap(section):
+    """
+    Return the sitemap of a section name, a key of STATIC_SITEMAPS or
+    profiles-<number>, or None.
+    """
+    if section in STATIC_SITEMAPS:
+        return STATIC_SITEMAPS[section]()
+    prefix, _, number = section.partition('-')
+    if prefix == 'profiles' and number.isdigit():
+        return ProfilesSitemap(int(number))
+    return None
+
+
+def invalidate_profile_sections():
+    """
+    Invalidate the cached sections of every profile, after bulk queries
+    which did not send the signals doing it.
+    """
+    last_pk = Profile.objects.aggregate(last_pk=Max('pk'))['last_pk'] or 0
+    for section in range(profile_section(last_pk) + 1):
+        cache.bump_sitemap_version(f'profiles-{section}')
@@ -0,0 +1,165 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import countries_version, directory_version
+from .facets import GRAD_YEAR_RANGES
+from .models import (APPLICATIONS_CHOICES, CAREER_STAGE_CHOICES, METHODS_CHOICES,
+                     Country, Profile)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SNAPSHOT_KEY = 'snapshot:{}'
+BUILD_LOCK_KEY = 'snapshot:building'
+LATEST_KEY = 'snapshot:latest'
+# seconds a process may spend building a snapshot before another one
+# starts over
+BUILD_TIMEOUT = 60
+# snapshots kept on disk, for the clients still loading previous ones
+KEPT_SNAPSHOTS = 3
+
+NAME_RE = re.compile(r'^directory-[0-9a-f]{16}\.json$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# columns of the profiles of a snapshot
+FIELDS = ('id', 'first_name', 'last_name', 'institution', 'country',
+          'position', 'career_stage', 'grad_year', 'methods',
+          'applications', 'keywords')
+
+
+def snapshot_version():
+    return f'{directory_version()}.{countries_version()}'
+
+
+def snapshot_content():
+    """
+    Return the public profiles, in the order of the directory, with the
+    labels needed to filter and display them, as compact JSON.
+    """
+    profiles = Profile.objects.directory() \
+                              .order_by('-publish_date', '-id') \
+                              .values_list('id', 'first_name', 'last_name', 'institution',
+                                           'country__code', 'position', 'career_stage',
+                                           'grad_year', 'methods', 'applications',
+                                           'keywords')
+    rows = [list(row[:8]) + [list(row[8] or ()), list(row[9] or ()), row[10]]
+            for row in profiles.iterator()]
+    countries = Country.objects.filter(code__in={row[4] for row in rows}) \
+                               .values_list('code', 'name', 'is_under_represented')
+    return json.dumps({
+        'fields': FIELDS,
+        'profiles': rows,
+        'countries': {code: [name, ur] for code, name, ur in countries},
+        'methods': dict(METHODS_CHOICES),
+        'applications': dict(APPLICATIONS_CHOICES),
+        'career_stages': dict(CAREER_STAGE_CHOICES),
+        'grad_year_ranges': [[key, first, last] for key, _, first, last in GRAD_YEAR_RANGES],
+    }, separators=(',', ':')).encode()
+
+
+def _write(path, content):
+    # readers never see a partially written file
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _prune(root):
+    names = sorted((name for name in os.listdir(root) if NAME_RE.match(name)),
+                   key=lambda name: os.path.getmtime(os.path.join(root, name)),
+                   reverse=True)
+    for name in names[KEPT_SNAPSHOTS:]:
+        for suffix in ('',) + tuple(suffix for _, suffix in ENCODINGS):
+            try:
+                os.remove(os.path.join(root, name + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def build_snapshot():
+    """
+    Write the snapshot of the directory, named after the hash of its
+    content, with its gzip and (if brotli is installed) brotli encodings,
+    and return its name.
+    """
+    content = snapshot_content()
+    name = f'directory-{hashlib.sha256(content).hexdigest()[:16]}.json'
+    root = settings.SNAPSHOT_ROOT
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, name)
+    if not os.path.exists(path):
+        _write(path + '.gz', gzip.compress(content, 9, mtime=0))
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(content))
+        # written last, as it marks the snapshot complete
+        _write(path, content)
+    else:
+        # kept over older snapshots by _prune
+        os.utime(path)
+    _prune(root)
+    return name
+
+
+def update_snapshot():
+    """
+    Return the name of the snapshot of the current directory version,
+    building it if none was yet. While another process builds it, return
+    the previous snapshot, if any.
+    """
+    version = snapshot_version()
+    key = SNAPSHOT_KEY.format(version)
+    name = cache.get(key)
+    if name is not None and snapshot_path(name):
+        return name
+
+    latest = latest_snapshot()
+    locked = cache.add(BUILD_LOCK_KEY, version, BUILD_TIMEOUT)
+    if not locked and latest is not None:
+        return latest
+    try:
+        name = build_snapshot()
+    finally:
+        if locked:
+            cache.delete(BUILD_LOCK_KEY)
+    cache.set(key, name, settings.PAGE_CACHE_TIMEOUT)
+    cache.set(LATEST_KEY, name, None)
+    return name
+
+
+def latest_snapshot():
+    """
+    Return the name of the last snapshot built, or None. Requests never
+    build one, the build_snapshot command does.
+    """
+    name = cache.get(LATEST_KEY)
+    if name is not None and snapshot_path(name):
+        return name
+
+    # built by a process not sharing the cache
+    root = settings.SNAPSHOT_ROOT
+    names = [name for name in os.listdir(root) if NAME_RE.match(name)] \
+        if os.path.isdir(root) else []
+    if not names:
+        return None
+    name = max(names, key=lambda name: os.path.getmtime(os.path.join(root, name)))
+    cache.set(LATEST_KEY, name, None)
+    return name
+
+
+def snapshot_path(name):
+    """
+    Return the path of a complete snapshot, or None.
+    """
+    if not NAME_RE.match(name):
+        return None
+    path = os.path.join(settings.SNAPSHOT_ROOT, name)
+    return path if os.path.exists(path) else None
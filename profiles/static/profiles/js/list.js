@@ -1,7 +1,7 @@
 (function() {
     $( document ).ready(function() {
         // Trigger search when checking/unchecking boxes in form
-        $('#underrepresented-only, #senior-only').change(function() {
+        $('#underrepresented-only, #senior-only, .facet-value').change(function() {
             $('#search-btn').click();
         });
 
@@ -30,7 +30,7 @@
 
         // infinite scroll
         // from https://simpleisbetterthancomplex.com/tutorial/2017/03/13/how-to-create-infinite-scroll-with-django.html
-        var infinite = new Waypoint.Infinite({
+        infinite = new Waypoint.Infinite({
             element: $('.infinite-container')[0],
             onBeforePageLoad: function () {
             $('.loading').show();
@@ -40,5 +40,126 @@
             },
             offset: 150
         });
+
+        searchSnapshot($('#list-search form'));
     });
+
+    var infinite = null;
+    var pageSize = 20;
+
+    function escapeHtml(text) {
+        return $('<div>').text(text == null ? '' : text).html();
+    }
+
+    function profileEntry(profile, detailUrl) {
+        var keywords = profile.labels.concat(profile.keywords ? [profile.keywords] : []).join(', ');
+        return '<div class="table-entry"><div class="row my-4 no-gutters">' +
+            '<div class="profile_id d-none">' + profile.id + '</div>' +
+            '<div class="col-xs-12 col-sm-4 col-lg-3"><h5 class="text-secondary font-weight-bold">' +
+                escapeHtml(profile.first_name + ' ' + profile.last_name) + '</h5></div>' +
+            '<div class="col-xs-12 col-sm-4 col-lg-3 text-tertiary">' +
+                '<p class="m-1"><i class="fas fa-user"></i> <span>' + escapeHtml(profile.position) + '</span></p>' +
+                '<p class="m-1"><i class="fas fa-university"></i> <span>' + escapeHtml(profile.institution) + '</span></p>' +
+                '<p class="m-1"><i class="fas fa-map-marker-alt"></i> <span>' + escapeHtml(profile.country_name) + '</span></p>' +
+            '</div>' +
+            '<div class="keywords-list col-lg-3 mt-1 d-none d-lg-block text-secondary">' + escapeHtml(keywords) + '</div>' +
+            '<div class="actions col-xs-12 col-sm-4 col-md-2 text-xs-left text-sm-right">' +
+                '<a class="btn pill-btn btn-outline-primary w-75 m-2" href="' +
+                detailUrl.replace('/0/', '/' + profile.id + '/') + '">View Profile</a>' +
+            '</div></div></div>';
+    }
+
+    function formParams(form) {
+        var facets = {};
+        form.find('.facet-value').each(function() {
+            facets[this.name] = facets[this.name] || [];
+            if (this.checked) {
+                facets[this.name].push(this.value);
+            }
+        });
+        return {
+            s: form.find('[name=s]').val(),
+            ur: form.find('[name=ur]').is(':checked'),
+            senior: form.find('[name=senior]').is(':checked'),
+            facets: facets
+        };
+    }
+
+    function showResults(form, snapshot) {
+        var params = formParams(form);
+        var results = snapshot.search(params);
+        var detailUrl = form.data('detail-url');
+        var shown = 0;
+
+        var container = $('#list-results').empty();
+        if (!results.length) {
+            container.append('<p class="text-secondary">No matching entries.</p>');
+        } else {
+            container.append('<div class="pb-3 no-gutters entries-number"><span id="search-message"> ' +
+                '<span class="text-primary font-weight-bold"> ' + results.length +
+                '</span> entries found. </span></div>');
+        }
+        var table = $('<div id="results-table">').appendTo(container);
+        var more = $('<button type="button" class="btn btn-link">More</button>').appendTo(container);
+        var showMore = function() {
+            table.append(results.slice(shown, shown + pageSize).map(function(profile) {
+                return profileEntry(profile, detailUrl);
+            }).join(''));
+            shown += pageSize;
+            more.toggle(shown < results.length);
+        };
+        more.click(showMore);
+        showMore();
+
+        // each facet is counted with the other filters only, as on the server
+        Object.keys(params.facets).forEach(function(name) {
+            var others = $.extend({}, params.facets);
+            delete others[name];
+            var counts = {};
+            snapshot.search($.extend({}, params, {facets: others})).forEach(function(profile) {
+                var values = {country: [profile.country], career_stage: [profile.career_stage],
+                              position: [profile.position], methods: profile.methods,
+                              applications: profile.applications, grad: [profile.grad_range]}[name] || [];
+                values.forEach(function(value) { counts[value] = (counts[value] || 0) + 1; });
+            });
+            form.find('.facet-value[name="' + name + '"]').each(function() {
+                $(this).siblings('label').find('.badge').text(counts[this.value] || 0);
+            });
+        });
+    }
+
+    // Once the snapshot of the directory is loaded, searches run in the
+    // browser instead of loading a new page.
+    function searchSnapshot(form) {
+        var url = form.data('snapshot-url');
+        if (!url || !window.fetch || !window.history.pushState || typeof DirectorySnapshot === 'undefined') {
+            return;
+        }
+        var snapshot = null;
+        var load = function() {
+            DirectorySnapshot.load(url).then(function(loaded) { snapshot = loaded; },
+                                             function() {});
+        };
+        if (document.activeElement === $('#search')[0]) {
+            load();
+        } else {
+            $('#search').one('focus input', load);
+        }
+
+        form.submit(function(e) {
+            if (!snapshot) {
+                return;
+            }
+            e.preventDefault();
+            if (infinite) {
+                infinite.destroy();
+                infinite = null;
+            }
+            showResults(form, snapshot);
+            history.pushState(null, '', '?' + form.serialize());
+        });
+        $(window).on('popstate', function() {
+            location.reload();
+        });
+    }
 })();
\ No newline at end of file
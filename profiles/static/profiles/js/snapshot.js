@@ -0,0 +1,120 @@
+// Search of the directory snapshot (see profiles/snapshot.py) in the
+// browser, with the filters of the directory list.
+const DirectorySnapshot = (function() {
+    const wordRe = /[\p{L}\p{N}_]+/gu;
+    const nameWeight = 4;
+    // TOKEN_MAX_LENGTH of profiles/search.py
+    const tokenMaxLength = 50;
+
+    function tokenize(text) {
+        return ((text || '').toLowerCase().match(wordRe) || []).map(function(word) {
+            return word.slice(0, tokenMaxLength);
+        });
+    }
+
+    function Snapshot(data) {
+        const self = this;
+        this.data = data;
+        this.countries = data.countries;
+        this.profiles = data.profiles.map(function(row) {
+            const profile = {};
+            data.fields.forEach(function(field, i) { profile[field] = row[i]; });
+            const country = data.countries[profile.country] || [profile.country, false];
+            profile.country_name = country[0];
+            profile.under_represented = country[1];
+            profile.name_words = tokenize(profile.first_name + ' ' + profile.last_name);
+            profile.words = tokenize([profile.institution, country[0], profile.position,
+                                      profile.keywords].join(' '));
+            profile.labels = profile.methods.map(function(code) { return data.methods[code]; })
+                .concat(profile.applications.map(function(code) { return data.applications[code]; }))
+                .filter(Boolean);
+            profile.search_labels = profile.labels.join('\n').toLowerCase();
+            profile.grad_range = self.gradRange(profile.grad_year);
+            return profile;
+        });
+    }
+
+    Snapshot.prototype.gradRange = function(gradYear) {
+        if (!/^\d{4}$/.test(gradYear || '')) {
+            return null;
+        }
+        const year = parseInt(gradYear, 10);
+        const range = this.data.grad_year_ranges.find(function(r) {
+            return (r[1] === null || year >= r[1]) && (r[2] === null || year <= r[2]);
+        });
+        return range ? range[0] : null;
+    };
+
+    // A profile matches a term as in the API (see search_filter in
+    // profiles/search.py): one of its words starts with it, or one of its
+    // methods or applications contains it. Unlike the server list, words
+    // with typos do not match.
+    function termScore(profile, term) {
+        const prefixed = function(word) { return word.startsWith(term); };
+        if (profile.name_words.some(prefixed)) {
+            return nameWeight;
+        }
+        return profile.words.some(prefixed) || profile.search_labels.includes(term) ? 1 : 0;
+    }
+
+    function matchesFacets(profile, facets) {
+        const values = {
+            country: [profile.country],
+            career_stage: [profile.career_stage],
+            position: [profile.position],
+            methods: profile.methods,
+            applications: profile.applications,
+            grad: [profile.grad_range]
+        };
+        return Object.keys(facets).every(function(name) {
+            const selected = facets[name];
+            return !selected.length || !(name in values)
+                || values[name].some(function(value) { return selected.includes(value); });
+        });
+    }
+
+    // Return the profiles matching every word of params.s, and the ur,
+    // senior and facet filters, the best matches first.
+    Snapshot.prototype.search = function(params) {
+        const terms = tokenize(params.s);
+        const results = [];
+        this.profiles.forEach(function(profile, order) {
+            if ((params.ur && !profile.under_represented)
+                    || (params.senior && profile.career_stage !== 'senior')
+                    || !matchesFacets(profile, params.facets || {})) {
+                return;
+            }
+            let score = 0;
+            for (let i = 0; i < terms.length; i++) {
+                const s = termScore(profile, terms[i]);
+                if (!s) {
+                    return;
+                }
+                score += s;
+            }
+            results.push({profile: profile, score: score, order: order});
+        });
+        results.sort(function(a, b) { return b.score - a.score || a.order - b.order; });
+        return results.map(function(result) { return result.profile; });
+    };
+
+    let loading = null;
+
+    // Load the current snapshot once per page.
+    function load(url) {
+        if (!loading) {
+            loading = fetch(url, {credentials: 'omit'})
+                .then(function(response) {
+                    if (!response.ok) {
+                        throw new Error('Snapshot unavailable: ' + response.status);
+                    }
+                    return response.json();
+                })
+                .then(function(data) { return new Snapshot(data); });
+            loading.catch(function() { loading = null; });
+        }
+        return loading;
+    }
+
+    return {load: load, tokenize: tokenize};
+})();
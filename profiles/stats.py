@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Profile, ProfileCounter, career_stage
+
+
+def instance_keys(profile):
+    """
+    Return the (kind, key) counters a profile contributes to.
+    """
+    if not profile.is_public:
+        return set()
+    return {
+        (ProfileCounter.COUNTRY, profile.country.code),
+        (ProfileCounter.POSITION, profile.position),
+        (ProfileCounter.CAREER_STAGE, profile.career_stage),
+    } | {
+        (ProfileCounter.METHOD, code)
+        for code in profile.selected_codes('methods')
+    } | {
+        (ProfileCounter.APPLICATION, code)
+        for code in profile.selected_codes('applications')
+    }
+
+
+def stored_keys(pk):
+    """
+    Return the counters the saved version of a profile contributes to.
+    """
+    profile = Profile.objects.filter(pk=pk) \
+                             .select_related('country') \
+                             .only('is_public', 'position', 'career_stage', 'methods',
+                                   'applications', 'country__code') \
+                             .first()
+    if profile is None:
+        return set()
+    return instance_keys(profile)
+
+
+def _add(kind, key, delta):
+    counter, _ = ProfileCounter.objects.select_for_update() \
+                                       .get_or_create(kind=kind, key=key)
+    ProfileCounter.objects.filter(pk=counter.pk).update(count=F('count') + delta)
+
+
+def update_counters(old_keys, new_keys):
+    """
+    Move a profile from the counters of its previous state to the ones of
+    its new state.
+    """
+    with transaction.atomic():
+        for kind, key in old_keys - new_keys:
+            _add(kind, key, -1)
+        for kind, key in new_keys - old_keys:
+            _add(kind, key, 1)
+
+
+def rename_country(old_code, new_code):
+    ProfileCounter.objects.filter(kind=ProfileCounter.COUNTRY, key=old_code) \
+                          .update(key=new_code)
+
+
+def rebuild_career_stages():
+    """
+    Derive the career stage of every profile from its position, as saving
+    does, for the profiles loaded raw from fixtures.
+    """
+    positions = Profile.objects.order_by().values_list('position', flat=True).distinct()
+    for position in positions:
+        Profile.objects.filter(position=position) \
+                       .update(career_stage=career_stage(position))
+
+
+def rebuild_counters():
+    """
+    Re-compute every counter from the profiles table.
+    """
+    public = Profile.objects.filter(is_public=True).order_by()
+    public_methods = Profile.research_methods.through.objects \
+                                                     .filter(profile__is_public=True)
+    public_applications = Profile.research_applications.through.objects \
+                                                     .filter(profile__is_public=True)
+    aggregates = (
+        (ProfileCounter.COUNTRY, public.values_list('country__code')),
+        (ProfileCounter.POSITION, public.values_list('position')),
+        (ProfileCounter.CAREER_STAGE, public.values_list('career_stage')),
+        (ProfileCounter.METHOD, public_methods.values_list('researchmethod')),
+        (ProfileCounter.APPLICATION,
+         public_applications.values_list('researchapplication')),
+    )
+
+    counters = []
+    for kind, values in aggregates:
+        counters += [ProfileCounter(kind=kind, key=key, count=count)
+                     for key, count in values.annotate(Count('id'))]
+
+    with transaction.atomic():
+        ProfileCounter.objects.all().delete()
+        ProfileCounter.objects.bulk_create(counters)
+    return len(counters)
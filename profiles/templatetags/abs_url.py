@@ -7,7 +7,8 @@ register = template.Library()
 def abs_url(context, view_name, *args, **kwargs):
     reversed = reverse(view_name, args=args, kwargs=kwargs)
     if 'request' not in context:
-        return reversed
+        # emails sent outside of a request give the site address instead
+        return context.get('base_url', '').rstrip('/') + reversed
     return context['request'].build_absolute_uri(reversed)
 
 @register.filter
@@ -1,11 +1,32 @@
-from django.test import TestCase
+import gzip
+import json
+import re
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.sites.models import Site
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import loader
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+
+from . import emails, metrics, middleware, outbox, routers
 
-from .models import Profile, Country
+from .facets import FacetIndex
+from .management.commands.refresh_fixtures import generate_accounts
+from .models import OutboxEmail, Profile, Country, User
+from .search import expand_term
 
 
 default_user = {
-    'name': 'Test Profile',
+    'first_name': 'Test',
+    'last_name': 'Profile',
     'position': 'Lecturer',
     'institution': 'Test institution',
     'grad_month': '06',
@@ -16,8 +37,15 @@ default_user = {
 }
 
 
+class DirectoryTestCase(TestCase):
+    def setUp(self):
+        # cached pages and sites outlive the test database transactions
+        cache.clear()
+        Site.objects.clear_cache()
+
+
 # Create your tests here.
-class ProfileIndexViewTests(TestCase):
+class ProfileIndexViewTests(DirectoryTestCase):
     def test_no_profile(self):
         """
         If no profiles exist, an appropriate message is displayed.
@@ -28,7 +56,7 @@ class ProfileIndexViewTests(TestCase):
         self.assertQuerysetEqual(response.context['profiles'], [])
 
 
-class ProfileDetailViewTests(TestCase):
+class ProfileDetailViewTests(DirectoryTestCase):
     profile = None
     country = None
 
@@ -36,6 +64,7 @@ class ProfileDetailViewTests(TestCase):
         """
         Construct fake profiles
         """
+        super().setUp()
         self.country = Country.objects.create(code='USA',
                                               name='United States',
                                               is_under_represented=False)
@@ -61,7 +90,7 @@ class ProfileDetailViewTests(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
-class ProfileListViewTests(TestCase):
+class ProfileListViewTests(DirectoryTestCase):
     profiles = []
     country = None
 
@@ -69,14 +98,17 @@ class ProfileListViewTests(TestCase):
         """
         Construct fake profiles
         """
+        super().setUp()
         self.country = Country.objects.create(code='USA',
                                               name='United States',
                                               is_under_represented=False)
 
+        self.profiles = []
         for i in range(1, 25):
             profile_settings = dict(default_user)
             profile_settings['country'] = self.country
-            profile_settings['name'] = f'User {i}'
+            profile_settings['first_name'] = f'User {i}'
+            profile_settings['is_public'] = True
             self.profiles.append(Profile.objects.create(**profile_settings))
 
     def test_list_profiles(self):
@@ -87,3 +119,1167 @@ class ProfileListViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(len(self.profiles) > 20)
         self.assertEqual(len(response.context['profiles']), 20)
+
+    def test_list_all_pages(self):
+        """
+        Following the cursors lists every profile once, most recent first
+        """
+        url = reverse('profiles:index_json')
+        response = self.client.get(url).json()
+        self.assertEqual(response['count'], len(self.profiles))
+        results = response['results']
+        while response['next']:
+            response = self.client.get(response['next']).json()
+            self.assertIsNone(response['count'])
+            results += response['results']
+
+        expected = sorted(self.profiles, key=lambda p: (p.publish_date, p.id),
+                          reverse=True)
+        self.assertEqual([p['id'] for p in results], [p.id for p in expected])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('profiles:index'), {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ProfileSearchTests(DirectoryTestCase):
+    def setUp(self):
+        """
+        Construct fake profiles in two countries
+        """
+        super().setUp()
+        usa = Country.objects.create(code='USA',
+                                     name='United States',
+                                     is_under_represented=False)
+        self.country = Country.objects.create(code='FRA',
+                                              name='France',
+                                              is_under_represented=False)
+
+        self.ada = Profile.objects.create(**dict(default_user,
+                                                 first_name='Ada',
+                                                 last_name='Lovelace',
+                                                 country=usa,
+                                                 methods='DL',
+                                                 applications='CV',
+                                                 is_public=True))
+        self.marie = Profile.objects.create(**dict(default_user,
+                                                   first_name='Marie',
+                                                   last_name='Curie',
+                                                   country=self.country,
+                                                   is_public=True))
+        self.hidden = Profile.objects.create(**dict(default_user,
+                                                    first_name='Hidden',
+                                                    country=self.country))
+
+    def search(self, s):
+        response = self.client.get(reverse('profiles:index'), {'s': s})
+        self.assertEqual(response.status_code, 200)
+        return set(response.context['profiles'])
+
+    def test_search_fields(self):
+        """
+        Names, country and the labels of methods and applications are searchable
+        """
+        self.assertEqual(self.search('lovelace'), {self.ada})
+        self.assertEqual(self.search('Fra'), {self.marie})
+        self.assertEqual(self.search('computer vision'), {self.ada})
+        # labels of choices are matched anywhere, as in 'Deep learning'
+        self.assertEqual(self.search('eep'), {self.ada})
+        self.assertEqual(self.search('test'), {self.ada, self.marie})
+
+    def test_expand_term(self):
+        """
+        Search terms are matched against labels without being read as regexes
+        """
+        self.assertEqual(expand_term('multi'), (('ALG',), ()))
+        self.assertEqual(expand_term('Vision'), ((), ('CV',)))
+        self.assertEqual(expand_term('.*'), ((), ()))
+
+    def test_search_all_terms(self):
+        """
+        Every search term has to match for a profile to be listed
+        """
+        self.assertEqual(self.search('marie france'), {self.marie})
+        self.assertEqual(self.search('marie united'), set())
+
+    def test_index_follows_changes(self):
+        """
+        The index is updated when a profile or its country changes
+        """
+        self.marie.keywords = 'radioactivity'
+        self.marie.save()
+        self.assertEqual(self.search('radio'), {self.marie})
+        self.assertEqual(self.search('two'), {self.ada})
+
+        self.country.name = 'Poland'
+        self.country.save()
+        self.assertEqual(self.search('poland'), {self.marie})
+        self.assertEqual(self.search('france'), set())
+
+
+class RankingTests(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.country = Country.objects.create(code='FRA', name='France')
+        self.grace = Profile.objects.create(**dict(default_user,
+                                                   first_name='Grace',
+                                                   last_name='Hopper',
+                                                   country=self.country,
+                                                   is_public=True))
+        self.ada = Profile.objects.create(**dict(default_user,
+                                                 first_name='Ada',
+                                                 last_name='Lovelace',
+                                                 keywords='compilers, hopper',
+                                                 applications='CV',
+                                                 country=self.country,
+                                                 is_public=True))
+
+    def search(self, s, cursor=None):
+        data = {'s': s, 'cursor': cursor} if cursor else {'s': s}
+        response = self.client.get(reverse('profiles:index'), data)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def ranked(self, s):
+        return list(self.search(s).context['profiles'])
+
+    def test_relevance(self):
+        """
+        Words in names weigh more than in keywords
+        """
+        self.assertEqual(self.ranked('hopper'), [self.grace, self.ada])
+        self.assertEqual(self.ranked('hopper compilers'), [self.ada])
+
+    def test_typos(self):
+        """
+        Longer words match with a few typos, shorter ones by prefix
+        """
+        self.assertEqual(self.ranked('computr vision'), [self.ada])
+        self.assertEqual(self.ranked('lovleace'), [self.ada])
+        self.assertEqual(self.ranked('lov'), [self.ada])
+        self.assertEqual(self.ranked('adx'), [])
+
+    def test_same_matches_as_api(self):
+        """
+        The list matches the profiles the API and the export match, and
+        also those with typos
+        """
+        url = reverse('profiles:profile-list')
+        for s in ('hopper', 'hop', 'ision', 'vision france', 'grace compilers', 'lovleace'):
+            api = [p['id'] for p in self.client.get(url, {'s': s}).json()['results']]
+            self.assertEqual(sorted(api), sorted(p.pk for p in Profile.objects.directory(s=s)))
+            ranked = [p.pk for p in self.ranked(s)]
+            if s == 'lovleace':
+                self.assertEqual((api, ranked), ([], [self.ada.pk]))
+            else:
+                self.assertEqual(sorted(ranked), sorted(api), s)
+
+    def test_pages(self):
+        """
+        Ranked results are paginated by cursor, the count on the first page
+        """
+        for i in range(25):
+            Profile.objects.create(**dict(default_user, first_name=f'Robot{i}',
+                                          keywords='robotics' + ' robotics' * (i % 3),
+                                          country=self.country, is_public=True))
+        response = self.search('robotics')
+        self.assertEqual(response.context['profiles_count'], 25)
+        profiles = list(response.context['profiles'])
+        cursor = response.context['page_obj'].next_cursor
+        # the facets are only counted for the first page
+        with mock.patch('profiles.facets._facet_values') as facet_values:
+            response = self.search('robotics', cursor)
+        self.assertFalse(facet_values.called)
+        profiles += response.context['profiles']
+        self.assertIsNone(response.context['page_obj'].next_cursor)
+        self.assertEqual(len(set(profiles)), 25)
+        self.assertEqual(profiles[0].keywords, 'robotics robotics robotics')
+
+
+class FacetTests(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        usa = Country.objects.create(code='USA', name='United States')
+        ken = Country.objects.create(code='KEN', name='Kenya', is_under_represented=True)
+        self.profiles = [
+            Profile.objects.create(**dict(default_user, is_public=True, **fields))
+            for fields in (
+                {'country': usa, 'position': 'Professor', 'methods': 'SL,DL', 'grad_year': '1985'},
+                {'country': usa, 'position': 'PhD student', 'methods': 'DL'},
+                {'country': ken, 'position': 'Professor', 'methods': 'RL', 'grad_year': '2012'},
+            )
+        ]
+        Profile.objects.create(**dict(default_user, country=ken))
+
+    def get(self, **params):
+        response = self.client.get(reverse('profiles:index'), params)
+        facets = {facet['name']: {value['value']: value['count']
+                                  for value in facet['values']}
+                  for facet in response.context['facets']}
+        ids = {profile.id for profile in response.context['profiles']}
+        return response.context['profiles_count'], facets, ids
+
+    def test_counts(self):
+        count, facets, _ = self.get()
+        self.assertEqual(count, 3)
+        self.assertEqual(facets['country'], {'KEN': 1, 'USA': 2})
+        self.assertEqual(facets['position'], {'PhD student': 1, 'Professor': 2})
+        self.assertEqual(facets['methods'], {'SL': 1, 'DL': 2, 'RL': 1})
+        self.assertEqual(facets['grad'], {'-1989': 1, '2010-2014': 2})
+
+    def test_filters(self):
+        """
+        Facets filter the list, the counts of a facet ignore its own selection
+        """
+        first, second, third = [profile.id for profile in self.profiles]
+        count, facets, ids = self.get(methods=['DL', 'RL'], position='Professor')
+        self.assertEqual((count, ids), (2, {first, third}))
+        self.assertEqual(facets['methods'], {'SL': 1, 'DL': 1, 'RL': 1})
+        self.assertEqual(facets['position'], {'PhD student': 1, 'Professor': 2})
+        self.assertEqual(facets['country'], {'KEN': 1, 'USA': 1})
+
+        count, facets, ids = self.get(grad='-1989', ur='on')
+        self.assertEqual((count, ids), (0, set()))
+        count, facets, ids = self.get(country='USA', s='test', grad='2010-2014')
+        self.assertEqual((count, ids), (1, {second}))
+        self.assertEqual(facets['grad'], {'-1989': 1, '2010-2014': 1})
+
+        count, facets, ids = self.get(country='FRA')
+        self.assertEqual((count, ids), (0, set()))
+        self.assertEqual(facets['country'], {'KEN': 1, 'USA': 2})
+
+    def test_updates(self):
+        first, second, third = self.profiles
+        first.position = 'PhD student'
+        first.save()
+        second.is_public = False
+        second.save()
+        self.assertEqual(self.get()[1]['position'], {'PhD student': 1, 'Professor': 1})
+
+        third.delete()
+        count, facets, _ = self.get()
+        self.assertEqual((count, facets['country']), (1, {'USA': 1}))
+
+    def test_rebuilt_outside_lock(self):
+        """
+        Indexes are rebuilt without blocking the readers of the previous one
+        """
+        self.get()
+        cache.clear()
+        build, locked = FacetIndex.build, []
+
+        def record(index, rows):
+            locked.append(FacetIndex._lock.locked())
+            build(index, rows)
+
+        with mock.patch.object(FacetIndex, 'build', record):
+            self.assertEqual(self.get()[0], 3)
+        self.assertEqual(locked, [False])
+
+
+class ProfileQueryCountTests(DirectoryTestCase):
+    """
+    Rendering a page must issue a fixed number of queries, whatever the
+    number of profiles and countries displayed.
+    """
+    def setUp(self):
+        super().setUp()
+        for i in range(1, 31):
+            country = Country.objects.create(code=f'C{i:02}',
+                                             name=f'Country {i}')
+            self.profile = Profile.objects.create(**dict(default_user,
+                                                         country=country,
+                                                         is_public=True))
+
+    def assertPageQueries(self, num, url, data=None):
+        with self.assertNumQueries(num):
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list_queries(self):
+        # page + facet index (profiles, countries), built once per process
+        response = self.assertPageQueries(3, reverse('profiles:index'))
+        self.assertContains(response, 'Country 30')
+        # the count comes from the facet index
+        self.assertPageQueries(1, reverse('profiles:index'), {'ur': 'on'})
+        # following pages skip the count
+        cursor = response.context['page_obj'].next_cursor
+        self.assertPageQueries(1, reverse('profiles:index'), {'cursor': cursor})
+        # page + ranking index, built once per process
+        self.assertPageQueries(2, reverse('profiles:index'),
+                               {'s': 'test country', 'senior': 'on'})
+        # page + profiles saved since the last update of the index
+        Profile.objects.create(**dict(default_user, country=Country.objects.first(),
+                                      is_public=True))
+        self.assertPageQueries(2, reverse('profiles:index'), {'senior': 'on'})
+
+    def test_detail_queries(self):
+        url = reverse('profiles:detail', args=(self.profile.id,))
+        response = self.assertPageQueries(1, url)
+        self.assertContains(response, 'Country 30')
+
+    def test_sitemap_queries(self):
+        # sections
+        self.assertPageQueries(1, reverse('profiles:sitemap'))
+        # site + count + page
+        self.assertPageQueries(3, reverse('profiles:sitemap_section',
+                                          args=('profiles-0',)))
+
+
+class QueryPlanTests(TestCase):
+    def test_public_queries_use_indexes(self):
+        """
+        Public pages do not read whole tables
+        """
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        scanning = [line for line in out.getvalue().splitlines()
+                    if not line.endswith(': OK')]
+        self.assertEqual(scanning, [])
+
+
+class ImportCountriesTests(TestCase):
+    def import_countries(self, *args):
+        out = StringIO()
+        call_command('import_countries', *args, stdout=out)
+        return out.getvalue().strip()
+
+    def test_import(self):
+        """
+        Re-importing the countries only updates the changed ones
+        """
+        self.assertEqual(self.import_countries(),
+                         '218 inserted, 0 updated, 0 unchanged.')
+        self.assertEqual(self.import_countries(),
+                         '0 inserted, 0 updated, 218 unchanged.')
+
+        Country.objects.filter(code='FRA').update(is_under_represented=True)
+        Country.objects.filter(code='ALB').delete()
+        # savepoint, select, insert, update, release
+        with self.assertNumQueries(5):
+            self.assertEqual(self.import_countries('--batch-size=500'),
+                             '1 inserted, 1 updated, 216 unchanged.')
+        self.assertFalse(Country.objects.get(code='FRA').is_under_represented)
+
+    def test_duplicate_codes(self):
+        """
+        Only the first line of a code is imported and counted
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf8') as f:
+            f.write('code\tname\tur\nFRA\tFrance\t0\nFRA\tFrench Republic\t1\n')
+            f.flush()
+            output = self.import_countries(f.name)
+        self.assertTrue(output.endswith('1 inserted, 0 updated, 0 unchanged.'))
+        self.assertIn('FRA', output)
+        self.assertEqual(Country.objects.get(code='FRA').name, 'France')
+
+
+class GenerateAccountsTests(TestCase):
+    def test_deterministic(self):
+        """
+        Generated accounts only depend on the seed, not on the batches
+        """
+        lists = (['Ada', 'Grace'], ['Lovelace', 'Hopper'], ['Test institution'], 3)
+        accounts = generate_accounts(1, 0, 10, *lists)
+        self.assertEqual(generate_accounts(1, 0, 4, *lists) +
+                         generate_accounts(1, 4, 10, *lists), accounts)
+        self.assertNotEqual(generate_accounts(2, 0, 10, *lists), accounts)
+        self.assertEqual(len({user['email'] for user, _ in accounts}), 10)
+
+
+class CountriesAutocompleteTests(DirectoryTestCase):
+    def search(self, q):
+        response = self.client.get(reverse('profiles:countries_autocomplete'), {'q': q})
+        return [result['text'] for result in response.json()['results']]
+
+    def test_search(self):
+        for code, name in (('USA', 'United States'), ('GBR', 'United Kingdom'),
+                           ('FRA', 'France')):
+            Country.objects.create(code=code, name=name)
+
+        self.assertEqual(self.search('united'), ['United Kingdom', 'United States'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('STAT uni'), ['United States'])
+        self.assertEqual(self.search(''), ['France', 'United Kingdom', 'United States'])
+        self.assertEqual(self.search('ted ance'), [])
+
+        Country.objects.create(code='ARE', name='United Arab Emirates')
+        self.assertEqual(self.search('united a'), ['United Arab Emirates', 'United States'])
+        country = Country.objects.get(code='FRA')
+        country.name = 'French Republic'
+        country.save()
+        self.assertEqual(self.search('fr'), ['French Republic'])
+
+    def test_browser_cache(self):
+        Country.objects.create(code='USA', name='United States')
+        url = reverse('profiles:countries_autocomplete')
+        response = self.client.get(url, {'q': 'uni'})
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'q': 'uni'},
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('max-age=3600', response['Cache-Control'])
+
+
+class StatisticsApiTests(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.usa = Country.objects.create(code='USA', name='United States')
+        self.fra = Country.objects.create(code='FRA', name='France')
+        self.profiles = [
+            Profile.objects.create(**dict(default_user, country=self.usa,
+                                          is_public=True)),
+            Profile.objects.create(**dict(default_user, country=self.usa,
+                                          is_public=True, position='Professor')),
+            Profile.objects.create(**dict(default_user, country=self.fra)),
+        ]
+
+    def get_countries(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profiles:country-list'))
+        return {c['name']: c['profiles_count'] for c in response.json()}
+
+    def get_positions(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profiles:position-list'))
+        return {p['position']: p['profiles_count'] for p in response.json()}
+
+    def test_counts(self):
+        """
+        Only public profiles are counted
+        """
+        self.assertEqual(self.get_countries(), {'United States': 2})
+        self.assertEqual(self.get_positions(), {'Lecturer': 1, 'Professor': 1})
+
+    def test_research_counts(self):
+        """
+        Methods and applications are counted from their normalized relations
+        """
+        profile = self.profiles[0]
+        profile.methods = ['DL', 'RL']
+        profile.save()
+        self.assertEqual(set(profile.research_methods.values_list('pk', flat=True)),
+                         {'DL', 'RL'})
+
+        response = self.client.get(reverse('profiles:method-list')).json()
+        counts = {m['code']: m['profiles_count'] for m in response}
+        self.assertEqual(counts, {'SL': 1, 'DL': 1, 'RL': 1})
+        self.assertIn({'code': 'DL', 'label': 'Deep learning',
+                       'profiles_count': 1}, response)
+
+        response = self.client.get(reverse('profiles:application-list')).json()
+        self.assertEqual(response, [{'code': 'HC', 'label': 'Healthcare',
+                                     'profiles_count': 2}])
+
+        # 'RL' is a substring of 'REL', but not the same method
+        self.assertFalse(Profile.objects.filter(research_methods='REL').exists())
+
+    def test_counts_follow_changes(self):
+        """
+        Counters are updated when profiles are edited, hidden or deleted
+        """
+        hidden = self.profiles[2]
+        hidden.is_public = True
+        hidden.save()
+        self.assertEqual(self.get_countries(), {'United States': 2, 'France': 1})
+        self.assertEqual(self.get_positions(), {'Lecturer': 2, 'Professor': 1})
+
+        moved = self.profiles[0]
+        moved.country = self.fra
+        moved.position = 'Professor'
+        moved.save()
+        self.assertEqual(self.get_countries(), {'United States': 1, 'France': 2})
+        self.assertEqual(self.get_positions(), {'Lecturer': 1, 'Professor': 2})
+
+        self.profiles[1].is_public = False
+        self.profiles[1].save()
+        hidden.delete()
+        self.assertEqual(self.get_countries(), {'France': 1})
+        self.assertEqual(self.get_positions(), {'Professor': 1})
+
+        self.fra.delete()
+        self.assertEqual(self.get_countries(), {})
+
+
+class CareerStageTests(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        country = Country.objects.create(code='USA', name='United States')
+        self.student = Profile.objects.create(**dict(default_user, country=country,
+                                                     position='PhD student',
+                                                     is_public=True))
+        self.lecturer = Profile.objects.create(**dict(default_user, country=country,
+                                                      is_public=True))
+
+    def test_stage_follows_position(self):
+        self.assertEqual(self.student.career_stage, 'student')
+        self.assertEqual(self.lecturer.career_stage, 'senior')
+
+        self.student.position = 'Senior data scientist/engineer'
+        self.student.save(update_fields=['position'])
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.career_stage, 'senior')
+
+        response = self.client.get(reverse('profiles:career_stage-list'))
+        self.assertEqual(response.json(), [{'code': 'senior', 'label': 'Senior',
+                                            'profiles_count': 2}])
+
+    def test_senior_filter(self):
+        response = self.client.get(reverse('profiles:index'), {'senior': 'on'})
+        self.assertEqual(list(response.context['profiles']), [self.lecturer])
+        response = self.client.get(reverse('profiles:index'),
+                                   {'career_stage': 'student'})
+        self.assertEqual(list(response.context['profiles']), [self.student])
+        response = self.client.get(reverse('profiles:profile-list'),
+                                   {'senior': 'on', 'fields': 'id,career_stage'})
+        self.assertEqual(response.json()['results'],
+                         [{'id': self.lecturer.pk, 'career_stage': 'senior'}])
+
+    def test_years_since_graduation(self):
+        today = timezone.datetime(2026, 3, 1).date()
+        self.assertEqual(self.lecturer.years_since_graduation(today), 15)
+        self.lecturer.grad_month = ''
+        self.assertEqual(self.lecturer.years_since_graduation(today), 15)
+        self.lecturer.grad_year = ''
+        self.assertIsNone(self.lecturer.years_since_graduation(today))
+
+
+class PageCacheTests(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.country = Country.objects.create(code='USA', name='United States')
+        self.profile = Profile.objects.create(**dict(default_user,
+                                                     country=self.country,
+                                                     is_public=True))
+
+    def assertCached(self, url, data=None, cached=True):
+        if cached:
+            with self.assertNumQueries(0):
+                response = self.client.get(url, data)
+        else:
+            response = self.client.get(url, data)
+        self.assertEqual(response['X-Cache'], 'HIT' if cached else 'MISS')
+        return response
+
+    def test_list_cache(self):
+        """
+        The list is cached per normalized search, until a public profile changes
+        """
+        url = reverse('profiles:index')
+        self.assertCached(url, {'s': 'test  profile'}, cached=False)
+        self.assertCached(url, {'s': ' test profile', 'utm': 'x'})
+        self.assertCached(url, {'s': 'profile test'}, cached=False)
+
+        hidden = Profile.objects.create(**dict(default_user, country=self.country))
+        hidden.save()
+        self.assertCached(url, {'s': 'test profile'})
+
+        self.profile.keywords = 'changed'
+        self.profile.save()
+        response = self.assertCached(url, {'s': 'test profile'}, cached=False)
+        self.assertContains(response, 'changed')
+
+    def test_detail_cache(self):
+        """
+        Detail pages are invalidated by their profile and by countries only
+        """
+        url = reverse('profiles:detail', args=(self.profile.id,))
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        Profile.objects.create(**dict(default_user, country=self.country,
+                                      is_public=True))
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.country.name = 'USA'
+        self.country.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'USA')
+
+    def test_no_cache_for_sessions(self):
+        url = reverse('profiles:index')
+        self.client.get(url)
+        self.client.cookies['sessionid'] = 'abc'
+        self.assertNotIn('X-Cache', self.client.get(url))
+
+    def test_stats(self):
+        url = reverse('profiles:index')
+        etag = self.client.get(url)['ETag']
+        self.client.get(url)
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        stats_url = reverse('profiles:page_cache_stats')
+        self.assertEqual(self.client.get(stats_url).status_code, 302)
+
+        staff = User.objects.create_user('staff@example.com', 'pass',
+                                         username='staff', is_staff=True)
+        self.client.force_login(staff)
+        stats = self.client.get(stats_url).json()
+        self.assertEqual(stats['index'], {'hits': 1, 'misses': 1, 'not_modified': 1})
+
+
+class ConditionalRequestTests(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.country = Country.objects.create(code='FRA', name='France')
+        self.profile = Profile.objects.create(**dict(default_user, country=self.country,
+                                                     is_public=True))
+
+    def assertNotModified(self, url, response, not_modified=True):
+        for header, condition in (('ETag', 'HTTP_IF_NONE_MATCH'),
+                                  ('Last-Modified', 'HTTP_IF_MODIFIED_SINCE')):
+            status = self.client.get(url, **{condition: response[header]}).status_code
+            self.assertEqual(status, 304 if not_modified else 200)
+
+    def test_detail(self):
+        url = reverse('profiles:detail', args=(self.profile.pk,))
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertNotModified(url, response)
+
+        # Last-Modified is only precise to the second
+        with mock.patch('time.time_ns', return_value=time.time_ns() + 10 ** 9):
+            self.profile.save()
+        self.assertNotModified(url, response, not_modified=False)
+
+    def test_list_and_api(self):
+        for url in (reverse('profiles:index'),
+                    reverse('profiles:position-list'),
+                    reverse('profiles:profile-detail', args=(self.profile.pk,))):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotModified(url, response)
+
+        # another representation of the same data
+        url = reverse('profiles:position-list')
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'format': 'api'})['ETag'], etag)
+
+    def test_no_validators_for_sessions(self):
+        url = reverse('profiles:index')
+        self.client.cookies['sessionid'] = 'abc'
+        self.assertNotIn('ETag', self.client.get(url))
+
+
+@override_settings(METRICS_SAMPLE_RATE=1)
+class MetricsTests(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        country = Country.objects.create(code='USA', name='United States')
+        Profile.objects.create(**dict(default_user, country=country, is_public=True))
+
+    def test_metrics(self):
+        url = reverse('profiles:index')
+        response = self.client.get(url)
+        self.assertRegex(response['Server-Timing'],
+                         r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="3 queries", '
+                         r'tpl;dur=[\d.]+, cache;desc="misses"$')
+        self.client.get(url)
+
+        metrics_url = reverse('profiles:metrics')
+        self.assertEqual(self.client.get(metrics_url).status_code, 302)
+        staff = User.objects.create_user('staff@example.com', 'pass',
+                                         username='staff', is_staff=True)
+        self.client.force_login(staff)
+        index = self.client.get(metrics_url).json()['views']['profiles:index']
+
+        self.assertEqual(index['requests'], 2)
+        self.assertEqual(index['cache'], {'misses': 1, 'hits': 1})
+        self.assertEqual(index['queries']['buckets']['<=0'], 1)
+        self.assertEqual(index['queries']['buckets']['<=5'], 1)
+        self.assertEqual(index['queries']['max'], 3)
+        self.assertGreater(index['template_ms']['max'], 0)
+        self.assertLessEqual(index['wall_ms']['p50'], index['wall_ms']['p99'])
+
+    def test_stale_processes(self):
+        """
+        Processes which stopped publishing are dropped
+        """
+        stopped = time.time() - metrics.PROCESS_TIMEOUT - 1
+        cache.set(metrics.PROCESSES_KEY, {'restarted-1': stopped})
+        cache.set(metrics.PROCESS_KEY.format('restarted-1'), {})
+        self.assertEqual(metrics.collect()['processes'], 1)
+        self.assertEqual(list(cache.get(metrics.PROCESSES_KEY)), [metrics._process])
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling(self):
+        response = self.client.get(reverse('profiles:index'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics.collect()['views'], {})
+
+
+class SnapshotTests(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(SNAPSHOT_ROOT=root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        country = Country.objects.create(code='FRA', name='France')
+        self.profile = Profile.objects.create(**dict(default_user, country=country,
+                                                     first_name='Marie', is_public=True))
+        Profile.objects.create(**dict(default_user, country=country, first_name='Hidden'))
+
+    def get_snapshot(self):
+        response = self.client.get(reverse('profiles:snapshot'))
+        self.assertEqual(response.status_code, 302)
+        return response['Location']
+
+    def build_snapshot(self):
+        call_command('build_snapshot', stdout=StringIO())
+
+    def test_not_built_in_requests(self):
+        response = self.client.get(reverse('profiles:snapshot'))
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+        self.build_snapshot()
+        url = self.get_snapshot()
+        # found on disk by the processes not sharing the cache
+        cache.clear()
+        self.assertEqual(self.get_snapshot(), url)
+
+    def test_snapshot(self):
+        self.build_snapshot()
+        url = self.get_snapshot()
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        snapshot = json.loads(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(snapshot['countries'], {'FRA': ['France', False]})
+        self.assertEqual([p[:3] for p in snapshot['profiles']],
+                         [[self.profile.pk, 'Marie', 'Profile']])
+
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), snapshot)
+        self.assertEqual(self.client.get(url + 'x').status_code, 404)
+
+    def test_regenerated_on_changes(self):
+        self.build_snapshot()
+        url = self.get_snapshot()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_snapshot(), url)
+
+        self.profile.keywords = 'radioactivity'
+        self.profile.save()
+        self.assertEqual(self.get_snapshot(), url)
+        self.build_snapshot()
+        self.assertNotEqual(self.get_snapshot(), url)
+
+
+class ReplicaTests(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        Profile.objects.create(**dict(default_user, is_public=True,
+                                      country=Country.objects.create(code='USA',
+                                                                     name='United States')))
+        self.reads = []
+
+        def db_for_read(router, model, **hints):
+            self.reads += [getattr(routers._state, 'replica', False)]
+            return None
+
+        for patcher in (mock.patch.object(routers, 'has_replica', return_value=True),
+                        mock.patch.object(routers.ReplicaRouter, 'db_for_read', db_for_read)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def age_versions(self):
+        old = format(time.time_ns() - 60 * 10 ** 9, 'x')
+        cache.set_many({'version:directory': old, 'version:countries': old}, None)
+
+    def read_from_replica(self, url, data=None):
+        self.reads = []
+        self.client.get(url, data)
+        self.assertTrue(self.reads)
+        return all(self.reads)
+
+    def test_public_views(self):
+        self.age_versions()
+        self.assertTrue(self.read_from_replica(reverse('profiles:index'), {'ur': 'on'}))
+        self.assertTrue(self.read_from_replica(reverse('profiles:profile-list')))
+
+    def test_primary_after_writes(self):
+        # the directory just changed
+        self.assertFalse(self.read_from_replica(reverse('profiles:index')))
+
+        self.age_versions()
+        self.reads = []
+        response = self.client.post(reverse('profiles:login'),
+                                    {'username': 'x', 'password': 'y'})
+        self.assertFalse(any(self.reads))
+        self.assertIn(middleware.PRIMARY_COOKIE, response.cookies)
+        self.assertFalse(self.read_from_replica(reverse('profiles:index')))
+
+
+class BenchmarkTests(DirectoryTestCase):
+    def test_synthetic_mix(self):
+        country = Country.objects.create(code='USA', name='United States')
+        Profile.objects.create(**dict(default_user, country=country, is_public=True))
+
+        out = StringIO()
+        call_command('benchmark', requests=50, mix='list=1,detail=1,api=1,sitemap=1',
+                     stdout=out)
+        report = out.getvalue()
+        for endpoint in ('list', 'detail', 'api countries', 'sitemap index'):
+            self.assertRegex(report, rf'\n{endpoint} +\d+ +0 ')
+        self.assertIn('50 requests in', report)
+
+
+class PasswordTests(TestCase):
+    def test_create_users(self):
+        users = User.objects.create_users([
+            {'username': f'user{i}', 'name': f'User {i}', 'email': f'user{i}@EXAMPLE.com'}
+            for i in range(3)
+        ], password='secret')
+        self.assertEqual(len({user.password for user in users}), 1)
+
+        user = User.objects.get(email='user2@example.com')
+        self.assertTrue(user.is_active)
+        self.assertTrue(user.check_password('secret'))
+
+        password = make_password('other')
+        users = User.objects.create_users([
+            {'username': 'hashed', 'name': 'Hashed', 'email': 'hashed@example.com'},
+        ], password=password, hashed=True)
+        self.assertEqual(users[0].password, password)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_rehash_on_login(self):
+        """
+        Passwords hashed by a fast development hasher are upgraded on login
+        """
+        user = User.objects.create_user('user@example.com', username='user')
+        user.password = make_password('secret', hasher='md5')
+        user.save()
+
+        self.assertTrue(self.client.login(email='user@example.com', password='secret'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user@example.com', 'pass',
+                                             username='user')
+
+    def test_reset_password_is_queued(self):
+        response = self.client.post(reverse('profiles:forgot'),
+                                    {'email': 'user@example.com'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mail.outbox, [])
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, 'user@example.com')
+
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.SENT)
+
+    def test_retries(self):
+        """
+        Failed emails are retried with a backoff, then given up
+        """
+        email = OutboxEmail.objects.create(subject='Test', body='Test',
+                                           from_email='directory@example.com',
+                                           to='user@example.com')
+        send_messages = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+        with mock.patch(send_messages, side_effect=OSError('unreachable')):
+            self.assertEqual(outbox.drain(max_attempts=2), (0, 1))
+            self.assertEqual(outbox.drain(max_attempts=2), (0, 0))
+
+            email.refresh_from_db()
+            self.assertEqual(email.status, OutboxEmail.PENDING)
+            self.assertGreater(email.next_attempt_at, timezone.now())
+
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.drain(max_attempts=2), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.FAILED)
+        self.assertIn('unreachable', email.last_error)
+        self.assertEqual(outbox.drain(), (0, 0))
+
+    def test_interrupted(self):
+        """
+        Emails are saved as sent one by one, the one interrupted keeps its
+        claim until it expires, the others are claimed until released
+        """
+        emails = [OutboxEmail.objects.create(subject='Test', body='Test',
+                                             from_email='directory@example.com',
+                                             to=f'user{i}@example.com')
+                  for i in range(3)]
+        send_messages = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+        with mock.patch(send_messages, side_effect=[1, KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                outbox.drain()
+        statuses = [OutboxEmail.objects.get(pk=e.pk).status for e in emails]
+        self.assertEqual(statuses, [OutboxEmail.SENT, OutboxEmail.SENDING,
+                                    OutboxEmail.PENDING])
+
+        # a worker killed before releasing them
+        self.assertEqual(len(outbox.claim(10)), 1)
+        self.assertEqual(outbox.drain(), (0, 0))
+        OutboxEmail.objects.filter(status=OutboxEmail.SENDING) \
+                           .update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.drain(), (2, 0))
+
+    def test_campaign(self):
+        """
+        Campaigns reach the filtered users once, even when run again
+        """
+        User.objects.create_user('other@example.com', 'pass', username='other')
+        User.objects.create_user('inactive@example.com', 'pass',
+                                 username='inactive', is_active=False)
+
+        def send_campaign(*args):
+            out = StringIO()
+            call_command('send_campaign', 'refresh', '--base-url=https://example.com',
+                         '--exclude=username=other', *args, stdout=out)
+            return out.getvalue().strip().splitlines()
+
+        self.assertEqual(send_campaign('--dry-run'), ['1 users to email.'])
+        self.assertEqual(send_campaign()[-1], 'Campaign refresh: 1 sent, 0 failed.')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        self.assertIn('https://example.com/profile/', mail.outbox[0].body)
+
+        self.assertEqual(send_campaign()[0], '0 emails queued.')
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_campaign_queued_concurrently(self):
+        """
+        Only the emails actually queued are counted
+        """
+        other = User.objects.create_user('other@example.com', 'pass', username='other')
+
+        def build(user):
+            if user == other:
+                # queued by another run meanwhile
+                outbox.enqueue_campaign('refresh', User.objects.filter(pk=other.pk),
+                                        lambda user: emails.refresh_profile_email(user, ''))
+            return emails.refresh_profile_email(user, '')
+
+        self.assertEqual(outbox.enqueue_campaign('refresh', User.objects.all(), build), 1)
+        self.assertEqual(OutboxEmail.objects.filter(campaign='refresh').count(), 2)
+
+    def test_resume_campaign(self):
+        """
+        A campaign interrupted while sending does not send the same email twice
+        """
+        User.objects.create_user('other@example.com', 'pass', username='other')
+        backend = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+        send = mail.backends.locmem.EmailBackend.send_messages
+        calls = []
+
+        def send_once(connection, messages):
+            calls.append(messages)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return send(connection, messages)
+
+        with mock.patch(backend, autospec=True, side_effect=send_once):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('send_campaign', 'refresh', '--base-url=https://example.com',
+                             stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+        # the email interrupted is sent again once its claim expires
+        call_command('send_campaign', 'refresh', '--base-url=https://example.com',
+                     stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        OutboxEmail.objects.filter(status=OutboxEmail.SENDING) \
+                           .update(next_attempt_at=timezone.now())
+        call_command('send_campaign', 'refresh', '--base-url=https://example.com',
+                     stdout=StringIO())
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ['other@example.com', 'user@example.com'])
+
+
+class EmailTemplateTests(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+        self.user = User(email='user@example.com', name="Ada O'Brien")
+
+    def test_same_as_render_to_string(self):
+        context = {'request': self.request, 'user': self.user,
+                   'uid': 'UID', 'token': 'TOKEN'}
+        for _ in range(2):
+            message = emails.user_create_confirm_email(
+                self.request, self.user, 'UID', 'TOKEN')
+            self.assertEqual(message.body, loader.render_to_string(
+                'registration/signup_confirm_email_body.txt', context))
+            self.assertEqual(message.alternatives[0][0], loader.render_to_string(
+                'registration/signup_confirm_email_body.html', context))
+
+        template = emails.get_email_template('registration/signup_confirm_email_body.txt')
+        self.assertIsNotNone(template.roots)
+        self.assertEqual(len(template.parts), 1)
+
+    def template(self, source):
+        template = emails.EmailTemplate('campaigns/refresh_profile_email_subject.txt')
+        template.template = emails.email_engine().from_string(source)
+        template.roots = emails._lookup_roots(template.template)
+        return template
+
+    def test_fallback(self):
+        """
+        Templates transforming variables are rendered normally
+        """
+        template = self.template(
+            '{{ user.name|upper }} {% if user.is_staff %}staff{% endif %}')
+        self.assertIsNone(template.roots)
+        self.assertEqual(template.render({'user': self.user}), 'ADA O&#39;BRIEN ')
+        self.user.is_staff = True
+        self.assertEqual(template.render({'user': self.user}), 'ADA O&#39;BRIEN staff')
+
+    def test_fallback_on_later_context(self):
+        """
+        Templates whose output depends on the values are rendered normally,
+        even when the first context rendered the same by substitution
+        """
+        template = self.template(
+            '{% autoescape off %}{{ user.name }}{% endautoescape %} {{ token.0 }}')
+        self.user.name = 'Ada'
+        self.assertEqual(template.render({'user': self.user, 'token': 'TOKEN'}), 'Ada T')
+        self.user.name = "Ada O'Brien"
+        self.assertEqual(template.render({'user': self.user, 'token': 'KEY'}),
+                         "Ada O'Brien K")
+        self.assertEqual(template.parts, {})
+
+    def test_string_attributes(self):
+        """
+        The attributes of string values are not substituted
+        """
+        template = self.template('{{ uid.0 }} {{ token }}')
+        self.assertEqual(template.render({'uid': 'UID', 'token': 'A&B'}), 'U A&amp;B')
+        self.assertEqual(template.render({'uid': 1, 'token': 'A&B'}), ' A&amp;B')
+
+
+class SitemapTests(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        country = Country.objects.create(code='FRA', name='France')
+        self.profiles = [
+            Profile.objects.create(**dict(default_user, country=country,
+                                          is_public=i != 2))
+            for i in range(5)
+        ]
+
+    def get_locations(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return re.findall(r'<loc>https?://[^/]+(.*?)</loc>',
+                          response.content.decode())
+
+    @mock.patch('profiles.sitemaps.SECTION_SIZE', 2)
+    def test_sections(self):
+        """
+        Public profiles are listed in sections of SECTION_SIZE ids
+        """
+        public = [p for p in self.profiles if p.is_public]
+        sections = self.get_locations(reverse('profiles:sitemap'))
+        self.assertEqual(sections[3:], [
+            reverse('profiles:sitemap_section', args=(f'profiles-{section}',))
+            for section in sorted({(p.pk - 1) // 2 for p in public})])
+
+        listed = []
+        for section in sections[3:]:
+            listed += self.get_locations(section)
+        self.assertEqual(listed, [p.get_absolute_url() for p in public])
+
+    @mock.patch('profiles.sitemaps.SECTION_SIZE', 2)
+    def test_section_cache(self):
+        """
+        Changing a profile only regenerates its section
+        """
+        urls = [reverse('profiles:sitemap_section', args=(f'profiles-{(p.pk - 1) // 2}',))
+                for p in self.profiles]
+        for url in urls:
+            self.client.get(url)
+
+        self.profiles[0].keywords = 'changed'
+        self.profiles[0].save()
+        self.assertEqual(self.client.get(urls[0])['X-Cache'], 'MISS')
+        other = next(url for url in urls if url != urls[0])
+        self.assertEqual(self.client.get(other)['X-Cache'], 'HIT')
+
+        self.assertEqual(self.client.get(reverse('profiles:sitemap_section',
+                                                 args=('unknown',))).status_code, 404)
+        self.assertEqual(self.client.get(reverse('profiles:sitemap_section',
+                                                 args=('profiles-99',))).status_code, 404)
+
+
+class ProfileApiTests(DirectoryTestCase):
+    def setUp(self):
+        super().setUp()
+        france = Country.objects.create(code='FRA', name='France')
+        chad = Country.objects.create(code='TCD', name='Chad',
+                                      is_under_represented=True)
+        for i in range(5):
+            Profile.objects.create(**dict(default_user, country=france,
+                                          last_name=f'Profile {i}',
+                                          is_public=True))
+        Profile.objects.create(**dict(default_user, country=chad,
+                                      last_name='Chad', is_public=True,
+                                      position='Professor'))
+        Profile.objects.create(**dict(default_user, country=france,
+                                      last_name='Private'))
+
+    def test_list(self):
+        url = reverse('profiles:profile-list')
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'fields': 'id,last_name,country',
+                                              'page_size': 4})
+        data = response.json()
+        self.assertEqual(data['count'], 6)
+        self.assertEqual(set(data['results'][0]), {'id', 'last_name', 'country'})
+
+        names = [p['last_name'] for p in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            self.assertIsNone(data['count'])
+            names += [p['last_name'] for p in data['results']]
+        self.assertEqual(sorted(names), ['Chad'] + [f'Profile {i}' for i in range(5)])
+
+        response = self.client.get(url, {'ur': 'on', 'senior': 'on'})
+        self.assertEqual([p['country'] for p in response.json()['results']], ['Chad'])
+        self.assertNotIn('contact_email', self.client.get(url).json()['results'][0])
+        self.assertEqual(self.client.get(url, {'fields': 'id,contact_email'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'fields': 'password'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': 'invalid'}).status_code, 404)
+
+    def test_detail(self):
+        private = Profile.objects.get(last_name='Private')
+        url = reverse('profiles:profile-detail', args=(private.pk,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_export(self):
+        url = reverse('profiles:profiles_export', args=('csv',))
+        response = self.client.get(url, {'fields': 'last_name,country,methods',
+                                         's': 'chad'})
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(),
+                         ['last_name,country,methods', 'Chad,Chad,Supervised learning'])
+
+        url = reverse('profiles:profiles_export', args=('jsonl',))
+        lines = b''.join(self.client.get(url).streaming_content).splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(json.loads(lines[0])['country_code'], 'FRA')
+        self.assertNotIn('contact_email', json.loads(lines[0]))
+        response = self.client.get(url, {'fields': 'contact_email'})
+        self.assertEqual(response.status_code, 400)
@@ -1,37 +1,51 @@
 from django.urls import path, include
-from django.contrib.sitemaps.views import sitemap
 from django.views.generic import TemplateView
 from django.contrib.auth.views import LoginView, LogoutView
 
 from rest_framework import routers
 
-from .sitemaps import HomeSitemap, FaqSitemap, \
-     ListSitemap, ProfilesSitemap
+from .cache import cache_public_page, detail_version, directory_version, sitemap_version
 from . import views
 
 router = routers.DefaultRouter()
-router.register(r'api/countries', views.RepresentedCountriesViewSet)
-router.register(r'api/positions', views.TopPositionsViewSet)
+router.register(r'api/countries', views.RepresentedCountriesViewSet, basename='country')
+router.register(r'api/positions', views.TopPositionsViewSet, basename='position')
+router.register(r'api/career-stages', views.TopCareerStagesViewSet, basename='career_stage')
+router.register(r'api/methods', views.TopMethodsViewSet, basename='method')
+router.register(r'api/applications', views.TopApplicationsViewSet, basename='application')
+router.register(r'api/profiles', views.ProfileViewSet, basename='profile')
 
 
-sitemaps = {
-    'home': HomeSitemap,
-    'list': ListSitemap,
-    'faq': FaqSitemap,
-    'profiles': ProfilesSitemap,
-}
-
 app_name = 'profiles'
 
+list_params = ('s', 'ur', 'senior', 'country', 'career_stage', 'position',
+               'methods', 'applications', 'grad', 'cursor')
+
 urlpatterns = [
-     path('', TemplateView.as_view(template_name='profiles/home.html'),
+    path('', cache_public_page(
+            TemplateView.as_view(template_name='profiles/home.html'),
+            'home'),
          name='home'),
-    path('list/', views.ListProfiles.as_view(),
+    path('list/', cache_public_page(
+            views.ListProfiles.as_view(),
+            'index', params=list_params, version=directory_version),
          name='index'),
-    path('list/<int:pk>/', views.ProfileDetail.as_view(),
+    path('list/json/', cache_public_page(
+            views.ListProfilesJson.as_view(),
+            'index_json', params=list_params, version=directory_version),
+         name='index_json'),
+    path('list/snapshot/', views.directory_snapshot,
+         name='snapshot'),
+    path('list/snapshot/<str:name>', views.snapshot_file,
+         name='snapshot_file'),
+    path('list/<int:pk>/', cache_public_page(
+            views.ProfileDetail.as_view(),
+            'detail', url_kwargs=('pk',), version=detail_version),
          name='detail'),
 
-    path('faq/', TemplateView.as_view(template_name='profiles/FAQs.html'),
+    path('faq/', cache_public_page(
+            TemplateView.as_view(template_name='profiles/FAQs.html'),
+            'faq'),
          name='faq'),
 
     path('countries-autocomplete/', views.CountriesAutocomplete.as_view(),
@@ -66,9 +80,22 @@ urlpatterns = [
      path('login/resend_confirmation', views.UserResendEmailConfirmationView.as_view(),
          name='resend_confirmation'),
 
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps},
-         name='django.contrib.sitemaps.views.sitemap'),
+    path('sitemap.xml', cache_public_page(
+            views.sitemap_index,
+            'sitemap', version=directory_version),
+         name='sitemap'),
+    path('sitemap-<slug:section>.xml', cache_public_page(
+            views.sitemap_section,
+            'sitemap_section', url_kwargs=('section',), version=sitemap_version),
+         name='sitemap_section'),
+
+    path('cache/stats/', views.page_cache_stats_view,
+         name='page_cache_stats'),
+    path('metrics/', views.metrics_view,
+         name='metrics'),
 
+    path('api/profiles/export.<str:format>', views.export_profiles,
+         name='profiles_export'),
     path('', include(router.urls)),
 #     path('api/', include('rest_framework.urls', namespace='rest_framework')),
 ]
@@ -1,35 +1,56 @@
-import re
+import csv
+import json
+import os
 import time
-from functools import reduce
-from operator import and_, or_
+from itertools import chain
 
 from dal.autocomplete import Select2QuerySetView
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import logout, update_session_auth_hash
 from django.contrib.auth.forms import PasswordResetForm, PasswordChangeForm, SetPasswordForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.tokens import default_token_generator
+from django.contrib.sitemaps import views as sitemap_views
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.exceptions import ValidationError
-from django.db.models import Count, Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, OuterRef, Q, Subquery
+from django.http import (FileResponse, Http404, HttpResponse, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from django.urls import reverse
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
-from django.views.decorators.cache import never_cache
+from django.utils.translation import gettext as _
+from django.views.decorators.cache import cache_control, never_cache
 from django.views.decorators.debug import sensitive_post_parameters
 from django.views.generic import TemplateView
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, FormView, ModelFormMixin
 from django.views.generic.list import ListView
-from rest_framework import viewsets
+from rest_framework import exceptions, viewsets
 
+from . import metrics, outbox, snapshot
+from .cache import (countries_version, detail_version, directory_version,
+                    page_cache_stats, versioned_condition)
 from .emails import user_create_confirm_email, user_reset_password_email
+from .facets import FACETS, bitmap_contains, facet_counts, popcount
 from .forms import (UserCreateForm, UserDeleteForm,
                     UserForm, UserProfileForm)
-from .models import Country, Profile, User
-from .serializers import CountrySerializer, PositionsCountSerializer
+from .models import Country, Profile, ProfileCounter, User
+from .pagination import (InvalidCursor, KeysetPagination, KeysetPaginator,
+                         RankedPaginator)
+from .ranking import rank
+from .search import search_countries
+from .serializers import (ApplicationsCountSerializer, CareerStagesCountSerializer,
+                          CountrySerializer, MethodsCountSerializer,
+                          PositionsCountSerializer,
+                          ProfileSerializer, requested_fields)
+from .sitemaps import STATIC_SITEMAPS, get_sitemap, profile_sections
 
 
 def _to_token(obj, field):
@@ -45,82 +66,104 @@ def _from_token(model, field, data_b64):
     return obj
 
 
+def directory_filters(params):
+    """
+    Return the ProfileQuerySet.directory() arguments of query parameters.
+    """
+    facets = {}
+    for name, label in FACETS:
+        values = [value for value in params.getlist(name) if value]
+        if values:
+            facets[name] = values
+    return {
+        's': params.get('s'),
+        'under_represented': params.get('ur') in ('on', 'true', '1'),
+        'senior': params.get('senior') in ('on', 'true', '1'),
+        'facets': facets,
+    }
+
+
 class ListProfiles(ListView):
     template_name = 'profiles/list.html'
     context_object_name = 'profiles'
     model = Profile
     paginate_by = 20
 
-    def get_queryset(self):
-        s = self.request.GET.get('s')
-        is_underrepresented = self.request.GET.get('ur') == 'on'
-        is_senior = self.request.GET.get('senior') == 'on'
-
-        # create filter on search terms
-        # q_st = ~Q(pk=None)  # always true
-        q_st = Q(is_public=True)
-        if s is not None:
-            # split search terms and filter empty words (if successive spaces)
-            search_terms = list(filter(None, s.split(' ')))
-
-            for st in search_terms:
-                st_regex = re.compile(f'.*{st}.*', re.IGNORECASE)
-
-                # matching_positions = list(
-                #   x[0]
-                #   for x in Profile.get_position_choices()
-                #   if st_regex.match(x[1]))
-                matching_methods = list(
-                    Q(methods__contains=x[0])
-                    for x
-                    in Profile.get_methods_choices()
-                    if st_regex.match(x[1]))
-                matching_applications = list(
-                    Q(applications__contains=x[0])
-                    for x
-                    in Profile.get_applications_choices()
-                    if st_regex.match(x[1]))
-
-                st_conditions = [
-                    Q(first_name__icontains=st),
-                    Q(last_name__icontains=st),
-                    Q(institution__icontains=st),
-                    Q(position__icontains=st),
-                    Q(country__name__icontains=st),
-                    Q(keywords__icontains=st),
-                 ] + matching_methods \
-                   + matching_applications
-
-                q_st = and_(reduce(or_, st_conditions), q_st)
-
-        #  create filter on under-represented countries
-        if is_underrepresented:
-            q_ur = Q(country__is_under_represented=True)
+    def paginate_queryset(self, queryset, page_size):
+        if self.ranked is None:
+            paginator = KeysetPaginator(queryset, page_size)
         else:
-            q_ur = ~Q(pk=None)  # always true
-
-        # create filter on senior profiles
-        if is_senior:
-            senior_profiles_keywords = ('Senior', 'Lecturer', 'Professor',
-                                        'Director')
-            # position must contain one of the words(case insensitive)
-            q_senior = reduce(or_, (Q(position__icontains=x)
-                                    for x
-                                    in senior_profiles_keywords))
-        else:
-            q_senior = ~Q(pk=None)  # always true
-
-        # apply filters
-        profiles_list = Profile.objects \
-                               .filter(q_st, q_ur, q_senior) \
-                               .order_by('-publish_date')
+            paginator = RankedPaginator(queryset, Profile.objects.for_list(), page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404(_('Invalid cursor.'))
+        return (paginator, page, page.object_list, page.has_next())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # only the first page displays the number of results and the facets,
+        # both counted from the facet index
+        if not self.request.GET.get('cursor'):
+            context['profiles_count'] = popcount(self.matching)
+            context['facets'] = self.facets
+            context['facets_selected'] = bool(self.filters['facets'])
+        return context
 
-        return profiles_list
+    def get_queryset(self):
+        self.filters = directory_filters(self.request.GET)
+        filters = dict(self.filters)
+        s = filters.pop('s')
+        # searches are ranked by relevance, from the in-memory index
+        self.ranked = rank(s) if s else None
+        matches = None if self.ranked is None else [pk for pk, _ in self.ranked]
+        # only the first page displays the facets
+        self.matching, self.facets = facet_counts(
+            matches, counts=not self.request.GET.get('cursor'), **filters)
+
+        if self.ranked is None:
+            # pagination takes care of the ordering
+            return Profile.objects \
+                          .directory(s=s, **filters) \
+                          .for_list()
+        contains = bitmap_contains(self.matching)
+        return [(pk, score) for pk, score in self.ranked if contains(pk)]
+
+
+class ListProfilesJson(ListProfiles):
+    """
+    Same results as ListProfiles, as JSON.
+    """
+    def render_to_response(self, context, **response_kwargs):
+        page = context['page_obj']
+        next_url = None
+        if page.has_next():
+            params = self.request.GET.copy()
+            params['cursor'] = page.next_cursor
+            next_url = f'{self.request.path}?{params.urlencode()}'
+
+        return JsonResponse({
+            'count': context.get('profiles_count'),
+            'facets': context.get('facets'),
+            'next': next_url,
+            'results': [{
+                'id': profile.id,
+                'first_name': profile.first_name,
+                'last_name': profile.last_name,
+                'position': profile.position,
+                'institution': profile.institution,
+                'country': profile.country.name,
+                'url': profile.get_absolute_url(),
+            } for profile in page],
+        })
 
 
 class ProfileDetail(DetailView):
     model = Profile
 
+    def get_queryset(self):
+        return Profile.objects.for_detail()
+
 
 class UserProfileView(TemplateView):
     template_name = "account/user_profile.html"
@@ -255,7 +298,7 @@ class UserCreateView(CreateView):
         valid = super().form_valid(form)        
         uid =_to_token(self.object, 'email')
         token = self.token_generator.make_token(self.object)
-        user_create_confirm_email(self.request, self.object, uid, token).send()
+        outbox.enqueue(user_create_confirm_email(self.request, self.object, uid, token))
         return valid
 
     def get_success_url(self):
@@ -305,7 +348,7 @@ class UserPasswordResetView(FormView):
             user = User.objects.get(email=email)
             uid =_to_token(user, 'email')
             token = self.token_generator.make_token(user)
-            user_reset_password_email(self.request, user, uid, token).send()
+            outbox.enqueue(user_reset_password_email(self.request, user, uid, token))
             messages.success(self.request, self.success_message)
         except User.DoesNotExist:
             messages.error(self.request, self.error_message)
@@ -378,7 +421,7 @@ class UserResendEmailConfirmationView(FormView):
             user = User.objects.get(**{ 'email': email })
             uid =_to_token(user, 'email')
             token = self.token_generator.make_token(user)
-            user_create_confirm_email(self.request, user, uid, token).send()
+            outbox.enqueue(user_create_confirm_email(self.request, user, uid, token))
             messages.success(self.request, self.success_message)
         except User.DoesNotExist:
             messages.error(self.request, self.error_message)
@@ -389,36 +432,223 @@ class UserResendEmailConfirmationView(FormView):
         return reverse('profiles:resend_confirmation')
 
 
+# browsers keep the results of each query, revalidated with the countries
+# version after an hour
+@method_decorator(cache_control(public=True, max_age=60 * 60), name='dispatch')
+@method_decorator(versioned_condition(countries_version), name='dispatch')
 class CountriesAutocomplete(Select2QuerySetView):
     def get_queryset(self):
-        countries = Country.objects.all()
-
-        # If search terms in request, split each word and search for them
-        # in name & institution
-        if self.q:
-            qs = ~Q(pk=None)  # always true
-            search_terms = list(filter(None, self.q.split(' ')))
-            for st in search_terms:
-                qs = and_(Q(name__icontains=st), qs)
-
-            countries = countries.filter(qs)
-
-        return countries
+        # countries are searched in memory, without a query per keystroke
+        return search_countries(self.q)
 
 
+@method_decorator(versioned_condition(directory_version), name='dispatch')
 class RepresentedCountriesViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Country.objects.annotate(profiles_count=Count('profile')) \
-                              .filter(profiles_count__gt=0)
+    # counts are maintained by profiles.stats
+    country_counters = ProfileCounter.objects.filter(kind=ProfileCounter.COUNTRY,
+                                                     count__gt=0)
+    queryset = Country.objects \
+        .filter(code__in=country_counters.values('key')) \
+        .annotate(profiles_count=Subquery(
+            country_counters.filter(key=OuterRef('code')).values('count')))
     serializer_class = CountrySerializer
     authentication_classes = []
 
 
+@method_decorator(versioned_condition(directory_version), name='dispatch')
 class TopPositionsViewSet(viewsets.ReadOnlyModelViewSet):
     authentication_classes = []
 
-    queryset = Profile.objects.all() \
-        .filter(is_public=True) \
-        .values('position') \
-        .annotate(profiles_count=Count('id')) \
+    # counts are maintained by profiles.stats
+    queryset = ProfileCounter.objects \
+        .filter(kind=ProfileCounter.POSITION, count__gt=0) \
+        .annotate(position=F('key'), profiles_count=F('count')) \
+        .values('position', 'profiles_count') \
         .order_by('-profiles_count')
     serializer_class = PositionsCountSerializer
+
+
+def _choice_counters(kind):
+    return ProfileCounter.objects \
+        .filter(kind=kind, count__gt=0) \
+        .annotate(code=F('key'), profiles_count=F('count')) \
+        .values('code', 'profiles_count') \
+        .order_by('-profiles_count')
+
+
+@method_decorator(versioned_condition(directory_version), name='dispatch')
+class TopCareerStagesViewSet(viewsets.ReadOnlyModelViewSet):
+    authentication_classes = []
+
+    # counts are maintained by profiles.stats
+    queryset = _choice_counters(ProfileCounter.CAREER_STAGE)
+    serializer_class = CareerStagesCountSerializer
+
+
+@method_decorator(versioned_condition(directory_version), name='dispatch')
+class TopMethodsViewSet(viewsets.ReadOnlyModelViewSet):
+    authentication_classes = []
+
+    # counts are maintained by profiles.stats
+    queryset = _choice_counters(ProfileCounter.METHOD)
+    serializer_class = MethodsCountSerializer
+
+
+@method_decorator(versioned_condition(directory_version), name='dispatch')
+class TopApplicationsViewSet(viewsets.ReadOnlyModelViewSet):
+    authentication_classes = []
+
+    # counts are maintained by profiles.stats
+    queryset = _choice_counters(ProfileCounter.APPLICATION)
+    serializer_class = ApplicationsCountSerializer
+
+
+def profile_api_version(pk=None):
+    return detail_version(pk) if pk is not None else directory_version()
+
+
+@method_decorator(versioned_condition(profile_api_version, url_kwargs=('pk',)),
+                  name='dispatch')
+class ProfileViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Public profiles, filtered like the directory by the s, ur and senior
+    query parameters. The fields parameter selects the fields returned,
+    e.g. ?fields=id,last_name,country.
+    """
+    authentication_classes = []
+    serializer_class = ProfileSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        if self.action == 'list':
+            profiles = Profile.objects.directory(**directory_filters(self.request.query_params))
+        else:
+            profiles = Profile.objects.filter(is_public=True)
+        return profiles.for_api()
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs['fields'] = requested_fields(self.request.query_params)
+        return super().get_serializer(*args, **kwargs)
+
+
+class Echo:
+    """
+    File-like object returning what is written, to stream a csv.writer.
+    """
+    def write(self, value):
+        return value
+
+
+def _export_value(value):
+    return '; '.join(value) if isinstance(value, list) else value
+
+
+def export_profiles(request, format):
+    """
+    Stream every public profile matching the directory filters as JSON
+    Lines or CSV, reading them from the database in chunks.
+    """
+    if format not in ('jsonl', 'csv'):
+        raise Http404(_('Unknown export format.'))
+    try:
+        fields = requested_fields(request.GET)
+    except exceptions.ValidationError as e:
+        return JsonResponse(e.detail, status=400)
+
+    # one serializer for every row, building one is not free
+    serializer = ProfileSerializer(fields=fields, context={'request': request})
+    profiles = Profile.objects \
+                      .directory(**directory_filters(request.GET)) \
+                      .for_api() \
+                      .order_by('pk') \
+                      .iterator(chunk_size=2000)
+    rows = (serializer.to_representation(profile) for profile in profiles)
+
+    if format == 'jsonl':
+        lines = (json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+        content_type = 'application/x-ndjson'
+    else:
+        writer = csv.writer(Echo())
+        header = list(serializer.fields)
+        lines = chain([writer.writerow(header)],
+                      (writer.writerow([_export_value(row[f]) for f in header])
+                       for row in rows))
+        content_type = 'text/csv'
+
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="wiml-directory.{format}"'
+    return response
+
+
+@cache_control(no_cache=True)
+def directory_snapshot(request):
+    """
+    Redirect to the last snapshot of the directory, built by the
+    build_snapshot command. Until there is one, browsers search through
+    the list view.
+    """
+    name = snapshot.latest_snapshot()
+    if name is None:
+        response = HttpResponse(_('No snapshot yet.'), status=503)
+        response['Retry-After'] = snapshot.BUILD_TIMEOUT
+        return response
+    return redirect('profiles:snapshot_file', name=name)
+
+
+@cache_control(public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+def snapshot_file(request, name):
+    """
+    Serve a snapshot in the best encoding the client accepts. Their names
+    change with their content, so they are cached for good.
+    """
+    path = snapshot.snapshot_path(name)
+    if path is None:
+        raise Http404(f'No snapshot {name}')
+    accepted = {value.split(';')[0].strip()
+                for value in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')}
+    encoding = None
+    for candidate, suffix in snapshot.ENCODINGS:
+        if candidate in accepted and os.path.exists(path + suffix):
+            encoding, path = candidate, path + suffix
+            break
+
+    response = FileResponse(open(path, 'rb'), content_type='application/json')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+@staff_member_required
+def page_cache_stats_view(request):
+    return JsonResponse(page_cache_stats())
+
+
+@staff_member_required
+def metrics_view(request):
+    return JsonResponse(metrics.collect())
+
+
+def sitemap_index(request):
+    """
+    Sitemap index listing the static pages and a section per range of
+    profile ids, with the last modification of the profiles in each.
+    """
+    sections = [(name, None) for name in STATIC_SITEMAPS] + \
+        [(f'profiles-{section}', lastmod) for section, lastmod in profile_sections()]
+    sitemaps = [
+        (request.build_absolute_uri(reverse('profiles:sitemap_section',
+                                            kwargs={'section': name})),
+         lastmod)
+        for name, lastmod in sections
+    ]
+    return TemplateResponse(request, 'profiles/sitemap_index.xml',
+                            {'sitemaps': sitemaps},
+                            content_type='application/xml')
+
+
+def sitemap_section(request, section):
+    sitemap = get_sitemap(section)
+    if sitemap is None:
+        raise Http404(f'No sitemap section {section}')
+    return sitemap_views.sitemap(request, {section: sitemap}, section=section)